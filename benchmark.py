@@ -0,0 +1,440 @@
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import random
+import socket
+import threading
+import time
+
+from aiohttp import ClientSession, web
+from gql import Client
+from graphql import parse, value_from_ast_untyped
+import psutil
+from query import KimAmm, SupSwapExchangeV2, SupSwapExchangeV3
+from utils import PooledAIOHTTPTransport, close_connections
+
+# synthetic data starts at this timestamp and block
+T0 = 1_700_006_400
+BLOCK0 = 1_000_000
+
+# response field name -> kind of synthetic rows, covering the entities of all
+# three exchange classes
+KINDS = {
+    "pairs": "pools",
+    "pools": "pools",
+    "supDayDatas": "exchangeDayDatas",
+    "uniswapDayDatas": "exchangeDayDatas",
+    "pairDayDatas": "poolDayDatas",
+    "poolDayDatas": "poolDayDatas",
+    "swaps": "swaps",
+}
+EXCHANGES = {
+    cls.__name__: cls for cls in [SupSwapExchangeV2, SupSwapExchangeV3, KimAmm]
+}
+
+
+class Dataset:
+    # rows are computed from their index, so the server serves any size in
+    # constant memory. every kind orders the same way by id and by time, so
+    # the id_gt cursor and the timestamp shard windows turn into index ranges.
+    def __init__(self, swaps: int, pools: int, days: int) -> None:
+        self.swaps = swaps
+        self.pools = pools
+        self.days = days
+        self.swap_interval = max(1, days * 86400 // swaps)
+        self.pool_interval = max(1, days * 86400 // pools)
+        self.day0 = T0 // 86400
+
+    def count(self, kind: str) -> int:
+        return {
+            "pools": self.pools,
+            "exchangeDayDatas": self.days,
+            "poolDayDatas": self.days * self.pools,
+            "swaps": self.swaps,
+        }[kind]
+
+    def index(self, kind: str, id: str) -> int:
+        if kind == "exchangeDayDatas":
+            return int(id) - self.day0
+
+        return int(id, 16)
+
+    def row(self, kind: str, i: int) -> dict:
+        if kind == "pools":
+            timestamp = str(T0 + i * self.pool_interval)
+            block = str(BLOCK0 + i)
+            return {
+                "id": f"0x{i:040x}",
+                "token0": self._token(i),
+                "token1": self._token(i + 1),
+                "block": block,
+                "createdAtBlockNumber": block,
+                "timestamp": timestamp,
+                "createdAtTimestamp": timestamp,
+            }
+
+        if kind == "exchangeDayDatas":
+            return {
+                "id": str(self.day0 + i),
+                "date": (self.day0 + i) * 86400,
+                "txCount": str(1000 * (i + 1)),
+                "totalTransactions": str(1000 * (i + 1)),
+            }
+
+        if kind == "poolDayDatas":
+            pool_id = f"0x{i % self.pools:040x}"
+            return {
+                "id": f"0x{i:012x}",
+                "date": (self.day0 + i // self.pools) * 86400,
+                "pairAddress": pool_id,
+                "pool": {"id": pool_id},
+                "dailyTxns": str(i % 100),
+                "txCount": str(i % 100),
+            }
+
+        pool_id = f"0x{i % self.pools:040x}"
+        wallet = f"0x{i * 7919 % 100_003:040x}"
+        block = str(BLOCK0 + i)
+        return {
+            "id": f"0x{i:012x}",
+            "timestamp": str(T0 + i * self.swap_interval),
+            "transaction": {"block": block, "blockNumber": block},
+            "pair": {"id": pool_id},
+            "pool": {"id": pool_id},
+            "from": wallet,
+            "origin": wallet,
+            "amountFeeUSD": f"{i % 1000 / 100}",
+        }
+
+    def _token(self, i: int) -> dict:
+        return {"id": f"0x{i:040x}", "name": "t", "symbol": "T", "decimals": "18"}
+
+    def rows(self, kind: str, where: dict, first: int, desc: bool) -> list:
+        # the cursor and the swap timestamps narrow the index range, any other
+        # filter is checked row by row
+        lo, hi = 0, self.count(kind)
+        rest = {}
+        for key, value in where.items():
+            if key == "id_gt":
+                lo = max(lo, self.index(kind, value) + 1)
+            elif kind == "swaps" and key == "timestamp_gte":
+                lo = max(lo, -(-(int(value) - T0) // self.swap_interval))
+            elif kind == "swaps" and key == "timestamp_lt":
+                hi = min(hi, -(-(int(value) - T0) // self.swap_interval))
+            else:
+                rest[key] = value
+
+        indices = range(hi - 1, lo - 1, -1) if desc else range(lo, hi)
+        rows = (self.row(kind, i) for i in indices)
+        if rest:
+            rows = (row for row in rows if _matches(row, rest))
+        return list(itertools.islice(rows, first))
+
+
+def _matches(row: dict, where: dict) -> bool:
+    # the subset of the subgraph filter language the exchange classes use:
+    # `field`, `field_in`, `field_gt(e)`, `field_lt(e)` and nested
+    # `relation_: {...}` filters. a relation compares by its id.
+    for key, value in where.items():
+        if key.endswith("_") and isinstance(value, dict):
+            if not _matches(row.get(key[:-1], {}), value):
+                return False
+            continue
+
+        field, _, op = key.rpartition("_")
+        if op not in _OPS:
+            field, op = key, ""
+        if field not in row:
+            raise ValueError(f"unsupported filter {key}")
+
+        actual = row[field]
+        if isinstance(actual, dict):
+            actual = actual["id"]
+        if not _OPS[op](actual, value):
+            return False
+
+    return True
+
+
+_OPS = {
+    "": lambda actual, value: str(actual) == str(value),
+    "not": lambda actual, value: str(actual) != str(value),
+    "in": lambda actual, value: str(actual) in {str(v) for v in value},
+    "gt": lambda actual, value: float(actual) > float(value),
+    "gte": lambda actual, value: float(actual) >= float(value),
+    "lt": lambda actual, value: float(actual) < float(value),
+    "lte": lambda actual, value: float(actual) <= float(value),
+}
+
+
+def _resolve(row: dict, selections) -> dict:
+    # fields missing from a synthetic row get a small number, which parses as
+    # both int and float
+    out = {}
+    for selection in selections:
+        name = selection.name.value
+        value = row.get(name, "1")
+        if selection.selection_set:
+            value = _resolve(value, selection.selection_set.selections)
+        out[(selection.alias or selection.name).value] = value
+
+    return out
+
+
+def _app(dataset: Dataset, latency: float, error_rate: float) -> web.Application:
+    stats = {"pages": 0, "errors": 0}
+
+    async def graphql(request):
+        body = await request.json()
+        await asyncio.sleep(latency)
+        if random.random() < error_rate:
+            stats["errors"] += 1
+            if random.random() < 0.5:
+                return web.Response(status=429, headers={"Retry-After": "0.1"})
+            return web.Response(status=502)
+
+        operation = parse(body["query"]).definitions[0]
+        variables = body.get("variables") or {}
+        data = {}
+        for field in operation.selection_set.selections:
+            name = field.name.value
+            key = (field.alias or field.name).value
+            if name == "_meta":
+                data[key] = {
+                    "block": {"number": BLOCK0 + max(dataset.swaps, dataset.pools)}
+                }
+                continue
+
+            args = {
+                argument.name.value: value_from_ast_untyped(argument.value, variables)
+                for argument in field.arguments
+            }
+            try:
+                rows = dataset.rows(
+                    KINDS[name],
+                    args.get("where") or {},
+                    args.get("first", 100),
+                    args.get("orderDirection") == "desc",
+                )
+            except (KeyError, ValueError) as error:
+                return web.json_response({"errors": [{"message": str(error)}]})
+            data[key] = [_resolve(row, field.selection_set.selections) for row in rows]
+
+        stats["pages"] += 1
+        return web.json_response({"data": data})
+
+    async def read_stats(request):
+        response = dict(stats)
+        stats.update(pages=0, errors=0)
+        return web.json_response(response)
+
+    app = web.Application(client_max_size=2**24)
+    app.router.add_post("/", graphql)
+    app.router.add_get("/stats", read_stats)
+    return app
+
+
+def serve(port: int, dataset: Dataset, latency: float, error_rate: float) -> None:
+    web.run_app(
+        _app(dataset, latency, error_rate),
+        host="127.0.0.1",
+        port=port,
+        print=None,
+        handle_signals=False,
+    )
+
+
+def start_server(dataset: Dataset, latency: float, error_rate: float) -> tuple:
+    # the server runs in its own process, so it does not add to the timings
+    # or the memory of the measured client
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    process = multiprocessing.Process(
+        target=serve, args=(port, dataset, latency, error_rate), daemon=True
+    )
+    process.start()
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+
+    return process, f"http://127.0.0.1:{port}/"
+
+
+class PeakRSS:
+    # samples the resident set size of this process in a background thread
+    def __init__(self, interval: float = 0.005) -> None:
+        self._interval = interval
+        self._process = psutil.Process()
+
+    def __enter__(self) -> "PeakRSS":
+        self.peak = self._process.memory_info().rss
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self) -> None:
+        while not self._done.wait(self._interval):
+            self.peak = max(self.peak, self._process.memory_info().rss)
+
+    def __exit__(self, *exc) -> None:
+        self._done.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._process.memory_info().rss)
+
+
+async def benchmark_exchange(cls, url: str, stats_session, shards: int = 1) -> list:
+    dd = cls(Client(transport=PooledAIOHTTPTransport(url=url)))
+    results = []
+
+    def record(stage, seconds, rows, peak, pages=None, errors=None):
+        results.append(
+            {
+                "exchange": cls.__name__,
+                "stage": stage,
+                "seconds": seconds,
+                "rows": rows,
+                "rows_per_second": rows / seconds if seconds else None,
+                "pages": pages,
+                "pages_per_second": (
+                    None if pages is None or not seconds else pages / seconds
+                ),
+                "errors": errors,
+                "peak_rss_mb": peak / 2**20,
+            }
+        )
+
+    async def measure_query(stage, query):
+        async with stats_session.get(url + "stats") as response:
+            await response.read()
+        with PeakRSS() as rss:
+            start = time.perf_counter()
+            data = await query()
+            seconds = time.perf_counter() - start
+        async with stats_session.get(url + "stats") as response:
+            stats = await response.json()
+        record(
+            stage,
+            seconds,
+            len(list(data.values())[0]),
+            rss.peak,
+            stats["pages"],
+            stats["errors"],
+        )
+        return data
+
+    def measure_parse(stage, parse, data, rows=None):
+        # rows are the input records, so rows/s is the parse throughput
+        with PeakRSS() as rss:
+            start = time.perf_counter()
+            result = parse(data)
+            seconds = time.perf_counter() - start
+        if rows is None:
+            rows = len(list(data.values())[0])
+        record(stage, seconds, rows, rss.peak)
+
+        return result
+
+    pools_data = await measure_query("query_pools", dd.query_pools)
+    exchange_day_data = await measure_query(
+        "query_exchange_day_data", dd.query_exchange_day_data
+    )
+    pool_day_data = await measure_query("query_pool_day_data", dd.query_pool_day_data)
+    swaps_data = await measure_query(
+        "query_swaps_data", lambda: dd.query_swaps_data(shards=shards)
+    )
+
+    measure_parse("parse_pools_data", dd.parse_pools_data, pools_data)
+    measure_parse(
+        "parse_exchange_day_data", dd.parse_exchange_day_data, exchange_day_data
+    )
+    measure_parse("parse_pool_day_data", dd.parse_pool_day_data, pool_day_data)
+    # the swap aggregations share the typed frame, so they are timed on their
+    # own after it is built
+    df_swaps = measure_parse("parse_swaps_frame", dd.parse_swaps_frame, swaps_data)
+    measure_parse("get_df_swaps", dd.get_df_swaps, df_swaps, rows=len(df_swaps))
+    measure_parse(
+        "get_df_swaps_by_pool",
+        dd.get_df_swaps_by_pool,
+        df_swaps,
+        rows=len(df_swaps),
+    )
+
+    return results
+
+
+async def run(url: str, exchanges: list, shards: int = 1) -> list:
+    results = []
+    async with ClientSession() as stats_session:
+        for name in exchanges:
+            results.extend(
+                await benchmark_exchange(
+                    EXCHANGES[name], url, stats_session, shards=shards
+                )
+            )
+    await close_connections()
+
+    return results
+
+
+def print_report(results: list) -> None:
+    def fmt(value, width, spec=""):
+        return "-".rjust(width) if value is None else format(value, f">{width}{spec}")
+
+    print(
+        f"{'exchange':<18} {'stage':<26} {'seconds':>9} {'rows':>10} "
+        f"{'rows/s':>11} {'pages':>6} {'pages/s':>8} {'errors':>6} {'rss MB':>8}"
+    )
+    for result in results:
+        print(
+            f"{result['exchange']:<18} {result['stage']:<26} "
+            f"{result['seconds']:>9.3f} {result['rows']:>10} "
+            f"{fmt(result['rows_per_second'], 11, ',.0f')} "
+            f"{fmt(result['pages'], 6)} "
+            f"{fmt(result['pages_per_second'], 8, '.1f')} "
+            f"{fmt(result['errors'], 6)} "
+            f"{result['peak_rss_mb']:>8.1f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="fetch and parse throughput against a local mock subgraph"
+    )
+    parser.add_argument("--swaps", type=int, default=100_000)
+    parser.add_argument("--pools", type=int, default=1_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--latency", type=float, default=0.0, help="per request")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--shards", type=int, default=1, help="for the swaps")
+    parser.add_argument(
+        "--exchange",
+        action="append",
+        choices=list(EXCHANGES),
+        help="defaults to all three",
+    )
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    dataset = Dataset(args.swaps, args.pools, args.days)
+    process, url = start_server(dataset, args.latency, args.error_rate)
+    try:
+        results = asyncio.run(run(url, args.exchange or list(EXCHANGES), args.shards))
+    finally:
+        process.terminate()
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# frames are written as `<path>/<name>.feather`, i.e. arrow ipc files. they are
+# uncompressed by default, which is what lets `read_frame` memory-map them:
+# the columns are then read straight from the page cache instead of being
+# decoded into memory, so opening even a multi-gb file is near instant.
+
+
+def _frame_path(path: str, name: str) -> str:
+    return os.path.join(path, f"{name}.feather")
+
+
+def write_frame(
+    path: str, name: str, df: pd.DataFrame, compression: str = "uncompressed"
+) -> None:
+    # the index (e.g. the datetime of the daily frames) and categoricals are
+    # kept, as arrow metadata and dictionary columns
+    file = _frame_path(path, name)
+    os.makedirs(path, exist_ok=True)
+    feather.write_feather(
+        pa.Table.from_pandas(df, preserve_index=True),
+        file + ".tmp",
+        compression=compression,
+    )
+    os.replace(file + ".tmp", file)
+
+
+def write_frames(path: str, frames: dict, compression: str = "uncompressed") -> None:
+    # e.g. the result of `fetch_exchanges`, or
+    # {"pools": dd.get_df_pools(...), "swaps": dd.parse_swaps_frame(...), ...}
+    for name, df in frames.items():
+        write_frame(path, name, df, compression=compression)
+
+
+def read_table(path: str, name: str, columns: list = None) -> pa.Table:
+    # zero copy for uncompressed files: the table's buffers point into the map.
+    # selecting `columns` keeps the index columns, so the frame's index
+    # survives the selection.
+    table = feather.read_table(_frame_path(path, name), memory_map=True)
+    if columns is None:
+        return table
+
+    index_columns = [
+        column
+        for column in (table.schema.pandas_metadata or {}).get("index_columns", [])
+        if isinstance(column, str) and column not in columns
+    ]
+    return table.select(list(columns) + index_columns)
+
+
+def read_frame(path: str, name: str, columns: list = None) -> pd.DataFrame:
+    # numeric columns without nulls stay views of the map, everything else
+    # (strings, categoricals, nullable columns) is converted on load
+    file = _frame_path(path, name)
+    if not os.path.exists(file):
+        return None
+
+    return read_table(path, name, columns=columns).to_pandas(split_blocks=True)
+
+
+def read_frames(path: str, names: list = None) -> dict:
+    if names is None:
+        names = sorted(
+            file[: -len(".feather")]
+            for file in os.listdir(path)
+            if file.endswith(".feather")
+        )
+
+    return {name: read_frame(path, name) for name in names}
@@ -0,0 +1,110 @@
+import asyncio
+
+import pandas as pd
+from utils import concat_frames, get_client
+
+
+class _Limit:
+    # enters the semaphores in order, so a task waiting for a busy endpoint
+    # does not hold a global slot another endpoint could use
+    def __init__(self, *semaphores: asyncio.Semaphore) -> None:
+        self._semaphores = semaphores
+
+    async def __aenter__(self) -> None:
+        for index, semaphore in enumerate(self._semaphores):
+            try:
+                await semaphore.acquire()
+            except BaseException:
+                for acquired in reversed(self._semaphores[:index]):
+                    acquired.release()
+                raise
+
+    async def __aexit__(self, *exc_info) -> None:
+        for semaphore in reversed(self._semaphores):
+            semaphore.release()
+
+
+async def fetch_exchanges(
+    exchanges: list,
+    max_concurrency: int = 8,
+    max_concurrency_per_endpoint: int = 4,
+    shards: int = 1,
+    batched: bool = False,
+    aggregate_only: bool = False,
+) -> dict:
+    # fetches pools, exchange day data, pool day data and swaps of every
+    # (class, endpoint) pair at once, so a full refresh takes as long as the
+    # slowest subgraph. entity fetches are limited globally and per endpoint,
+    # and each endpoint is crawled over a single session. `batched` pages the
+    # four entities of an endpoint together instead, see `query_batched`.
+    # `aggregate_only` skips the swaps and derives their daily metrics from
+    # the day data, see `get_df_swaps_from_day_data`.
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch(limit, query, *args, **kwargs):
+        async with limit:
+            return await query(*args, **kwargs)
+
+    async def fetch_exchange(cls, endpoint):
+        limit = _Limit(asyncio.Semaphore(max_concurrency_per_endpoint), semaphore)
+
+        async with get_client(endpoint) as session:
+            dd = cls(session)
+            if batched:
+                pools_data, exchange_day_data, pool_day_data, swaps_data = await fetch(
+                    limit, dd.query_batched, shards=shards, swaps=not aggregate_only
+                )
+            else:
+                queries = [
+                    fetch(limit, dd.query_pools),
+                    fetch(limit, dd.query_exchange_day_data),
+                    fetch(limit, dd.query_pool_day_data),
+                ]
+                if not aggregate_only:
+                    # every shard takes its own slots, so a sharded crawl
+                    # stays within the limits as well
+                    queries.append(
+                        dd.query_swaps_data(shards=shards, limit=limit)
+                        if shards > 1
+                        else fetch(limit, dd.query_swaps_data)
+                    )
+                pools_data, exchange_day_data, pool_day_data, *swaps_data = (
+                    await asyncio.gather(*queries)
+                )
+                swaps_data = swaps_data[0] if swaps_data else None
+
+        df_pools_data = dd.parse_pools_data(pools_data)
+        df_exchange_day_data = dd.parse_exchange_day_data(exchange_day_data)
+        df_pool_day_data = dd.parse_pool_day_data(pool_day_data)
+        if swaps_data is None:
+            df_swaps_data = dd.get_df_swaps_from_day_data(df_exchange_day_data)
+            df_swaps_data_by_pool = dd.get_df_swaps_by_pool_from_day_data(
+                df_pool_day_data
+            )
+        else:
+            df_swaps = dd.parse_swaps_frame(swaps_data)
+            del swaps_data
+            df_swaps_data = dd.get_df_swaps(df_swaps)
+            df_swaps_data_by_pool = dd.get_df_swaps_by_pool(df_swaps)
+
+        return {
+            "pools": dd.get_df_pools(df_pools_data),
+            "tokens": dd.df_tokens(df_pools_data),
+            "exchange_day": dd.get_df_exchange_day(df_exchange_day_data, df_swaps_data),
+            "pool_day": dd.get_df_pool_day(df_pool_day_data, df_swaps_data_by_pool),
+        }
+
+    results = await asyncio.gather(
+        *[fetch_exchange(cls, endpoint) for cls, endpoint in exchanges]
+    )
+
+    return {
+        name: concat_frames(
+            [
+                result[name].assign(exchange=cls.__name__)
+                for (cls, _), result in zip(exchanges, results)
+            ],
+            ignore_index=False,
+        )
+        for name in results[0]
+    }
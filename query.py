@@ -1,66 +1,1171 @@
+import asyncio
+import collections
+import contextlib
+from concurrent.futures import Executor, ThreadPoolExecutor
+import contextvars
+import hashlib
+import json
+import os
+
 from gql import gql
+import numpy as np
 import pandas as pd
-from utils import query_until_end
+from pandas.api.types import union_categoricals
+import sketch
+from store import Store
+from tracing import traced
+from utils import (
+    Checkpoint,
+    PageSizeController,
+    concat_frames,
+    connect,
+    decode_records,
+    iter_pages,
+    project,
+    query_bounds,
+    query_head_block,
+    query_until_end,
+    query_until_end_batched,
+    query_until_end_sharded,
+    selection_paths,
+    split_range,
+    unify_categories,
+)
+
+# rows handed to a parse executor at once, and batches in flight before the
+# crawl waits for the oldest
+PARSE_BATCH_ROWS = 10_000
+PARSE_MAX_PENDING = 2 * (os.cpu_count() or 1)
+# per-pool fan-out: pools sharing one request, and the estimated swaps of one
+# request window
+FANOUT_POOLS_PER_REQUEST = 100
+FANOUT_WINDOW_ROWS = 50_000
+
+
+def _normalize_batch(cls, name: str, data: "JSON") -> pd.DataFrame:
+    # the normalizers only read class attributes, so a worker process runs them
+    # on a bare instance instead of pickling the client along with `self`
+    return getattr(cls.__new__(cls), name)(data)
+
+
+def _unix(value) -> int:
+    if isinstance(value, (int, float)):
+        return int(value)
+
+    value = pd.Timestamp(value)
+    if value.tzinfo is None:
+        value = value.tz_localize("utc")
+    return int(value.timestamp())
+
+
+def _set_filter(where: dict, field: str, op: str, value) -> None:
+    # "transaction.block" becomes {"transaction_": {"block_gte": ...}}
+    *path, field = field.split(".")
+    for name in path:
+        where = where.setdefault(f"{name}_", {})
+    where[f"{field}_{op}"] = value
 
 
 class Base:
-    def __init__(self, client) -> None:
+    _swaps_float_columns = [
+        "amountFeeUSD",
+    ]
+    _timestamp_fields = {
+        "pools": "createdAtTimestamp",
+        "exchangeDayDatas": "date",
+        "poolDayDatas": "date",
+        "swaps": "timestamp",
+    }
+    # running totals kept next to each per-bucket column
+    _totals = {
+        "new_pool_count": "total_pool_count",
+        "new_token_count": "total_token_count",
+        "new_swap_count": "total_swap_count",
+        "daily_fee_in_usd": "total_fee_in_usd",
+        "new_trader_count": "total_trader_count",
+    }
+    # running totals of the exchange day data, taken over its daily columns
+    _exchange_day_totals = {
+        "totalVolumeETH": "dailyVolumeETH",
+        "totalVolumeUSD": "dailyVolumeUSD",
+        "totalFeeUSD": "dailyFeeUSD",
+    }
+    # dotted fields are filtered through the related entity
+    _block_fields = {
+        "pools": "createdAtBlockNumber",
+        "swaps": "transaction.blockNumber",
+    }
+    _pool_fields = {
+        "pools": "id",
+        "poolDayDatas": "pool",
+        "swaps": "pool",
+    }
+
+    def __init__(
+        self,
+        client,
+        store: Store = None,
+        checkpoint_dir: str = None,
+        executor: Executor = None,
+    ) -> None:
         self._client = client
+        self._store = store
+        self._checkpoint_dir = checkpoint_dir
+        self._executor = executor
+
+    def _checkpoint_path(self, name: str, resume: bool) -> str:
+        if self._checkpoint_dir is None:
+            if resume:
+                raise ValueError("resume needs a checkpoint_dir")
+            return None
+
+        return os.path.join(self._checkpoint_dir, f"{type(self).__name__}-{name}")
+
+    def _checkpoint(
+        self, name: str, resume: bool, where: dict = None, columns: list = None
+    ) -> Checkpoint:
+        path = self._checkpoint_path(
+            self._checkpoint_name(name, where, columns), resume
+        )
+        if path is None:
+            return None
+
+        return Checkpoint(path + ".jsonl", resume=resume)
+
+    def _checkpoint_name(
+        self, name: str, where: dict = None, columns: list = None
+    ) -> str:
+        # a filtered or projected crawl gets its own checkpoint, so resuming
+        # never replays pages fetched under a different filter or selection.
+        if not where and columns is None:
+            return name
+
+        digest = hashlib.sha256(
+            json.dumps([where, columns], sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        return f"{name}-{digest[:12]}"
+
+    def _where(
+        self,
+        entity: str,
+        since=None,
+        until=None,
+        blocks: tuple = None,
+        pool_ids: list = None,
+    ) -> dict:
+        # `since`/`until` and `blocks` are half-open ranges, either end may be
+        # left open. timestamps are unix seconds or anything pd.Timestamp
+        # parses, naive values are taken as utc.
+        where = {}
+        if since is not None:
+            where.update(self._timestamp_filter(entity, "gte", _unix(since)))
+        if until is not None:
+            where.update(self._timestamp_filter(entity, "lt", _unix(until)))
+
+        if blocks is not None:
+            if entity not in self._block_fields:
+                raise ValueError(f"{entity} can not be filtered by block")
+            for op, value in zip(["gte", "lt"], blocks):
+                if value is not None:
+                    _set_filter(where, self._block_fields[entity], op, str(value))
+
+        if pool_ids is not None:
+            if entity not in self._pool_fields:
+                raise ValueError(f"{entity} can not be filtered by pool")
+            _set_filter(
+                where,
+                self._pool_fields[entity],
+                "in",
+                [pool_id.lower() for pool_id in pool_ids],
+            )
+
+        return where
+
+    def _project(self, query: str, columns: list = None) -> str:
+        if columns is None:
+            return query
 
-    async def query_pools(self) -> "JSON":
-        return await query_until_end(self._client, gql(self._query_get_pools()))
+        return project(query, tuple(sorted(columns)))
 
+    @traced
+    async def query_pools(
+        self,
+        since=None,
+        until=None,
+        blocks: tuple = None,
+        pool_ids: list = None,
+        columns: list = None,
+        resume: bool = False,
+    ) -> "JSON":
+        where = self._where("pools", since, until, blocks, pool_ids)
+        return await query_until_end(
+            self._client,
+            gql(self._project(self._query_get_pools(), columns)),
+            where=where,
+            checkpoint=self._checkpoint("pools", resume, where, columns),
+        )
+
+    @traced
     def parse_pools_data(self, data: "JSON") -> pd.DataFrame:
-        df = pd.json_normalize(data=data["pools"])
-        df["datetime"] = pd.to_datetime(df["timestamp"].astype(int), utc=True, unit="s")
+        return self._normalize_pools(data["pools"])
+
+    def _normalize_pools(self, data: "JSON") -> pd.DataFrame:
+        df = decode_records(
+            data,
+            selection_paths(self._query_get_pools()),
+            int_columns=["timestamp"],
+            category_columns=["id", "token0.id", "token1.id"],
+        )
+        df["datetime"] = pd.to_datetime(df["timestamp"], utc=True, unit="s")
         df.drop(columns="timestamp", inplace=True)
 
         return df
 
+    @traced
     def get_df_pools(self, df: pd.DataFrame) -> pd.DataFrame:
-        df_pools = df.groupby(pd.Grouper(key="datetime", axis=0, freq="D")).agg(
+        return self._reindex(self._daily_pools(df))
+
+    def _daily_pools(self, df: pd.DataFrame, freq: str = "D") -> pd.DataFrame:
+        return df.groupby(pd.Grouper(key="datetime", axis=0, freq=freq)).agg(
             new_pool_count=("id", "count")
         )
-        idx = pd.date_range(df_pools.index.min(), pd.Timestamp.utcnow())
-        df_pools = df_pools.reindex(idx, fill_value=0)
-        df_pools.sort_index(ascending=True, inplace=True)
-        df_pools["total_pool_count"] = df_pools["new_pool_count"].cumsum()
 
-        return df_pools
+    def _reindex(self, df: pd.DataFrame, freq: str = "D") -> pd.DataFrame:
+        # fills the buckets without rows from the first one up to now and adds
+        # the running totals. a filtered window may hold no rows at all, which
+        # leaves an empty frame with the same columns.
+        if df.empty:
+            df = df.copy()
+            for column, total in self._totals.items():
+                if column in df:
+                    df[total] = df[column]
+            return df
+
+        idx = pd.date_range(
+            df.index.min(), max(df.index.max(), pd.Timestamp.utcnow()), freq=freq
+        )
+        df = df.reindex(idx, fill_value=0)
+        df.sort_index(ascending=True, inplace=True)
+        for column, total in self._totals.items():
+            if column in df:
+                df[total] = df[column].cumsum()
 
+        return df
+
+    @traced
     def df_tokens(client, df: pd.DataFrame) -> pd.DataFrame:
-        df_tokens = pd.concat(
-            [
-                df[["datetime", "token0.id"]].rename(columns={"token0.id": "token.id"}),
-                df[["datetime", "token1.id"]].rename(columns={"token1.id": "token.id"}),
-            ]
-        ).reset_index()
-        tmp = df_tokens.groupby("token.id").agg(first=("datetime", "min")).reset_index()
-        token_first_deployments = dict(zip(tmp["token.id"], tmp["first"]))
+        df_tokens = pd.DataFrame(
+            {
+                "datetime": pd.concat(
+                    [df["datetime"], df["datetime"]], ignore_index=True
+                ),
+                "token.id": pd.Series(
+                    union_categoricals([df["token0.id"], df["token1.id"]])
+                ),
+            }
+        )
         df_tokens["first"] = (
-            df_tokens["token.id"].map(token_first_deployments) == df_tokens["datetime"]
+            df_tokens.groupby("token.id", observed=True)["datetime"].transform("min")
+            == df_tokens["datetime"]
         )
         df_tokens = df_tokens.groupby(pd.Grouper(key="datetime", axis=0, freq="D")).agg(
             new_token_count=("first", "sum")
         )
-        idx = pd.date_range(df_tokens.index.min(), pd.Timestamp.utcnow())
-        df_tokens = df_tokens.reindex(idx, fill_value=0)
-        df_tokens.sort_index(ascending=True, inplace=True)
-        df_tokens["total_token_count"] = df_tokens["new_token_count"].cumsum()
 
-        return df_tokens
+        return client._reindex(df_tokens)
 
-    async def query_exchange_day_data(self) -> "JSON":
+    @traced
+    async def query_exchange_day_data(
+        self,
+        since=None,
+        until=None,
+        columns: list = None,
+        resume: bool = False,
+    ) -> "JSON":
+        where = self._where("exchangeDayDatas", since, until)
         return await query_until_end(
-            self._client, gql(self._query_get_exchange_day_data())
+            self._client,
+            gql(self._project(self._query_get_exchange_day_data(), columns)),
+            where=where,
+            checkpoint=self._checkpoint("exchangeDayDatas", resume, where, columns),
+        )
+
+    @traced
+    async def query_pool_day_data(
+        self,
+        since=None,
+        until=None,
+        pool_ids: list = None,
+        columns: list = None,
+        resume: bool = False,
+    ) -> "JSON":
+        where = self._where("poolDayDatas", since, until, pool_ids=pool_ids)
+        return await query_until_end(
+            self._client,
+            gql(self._project(self._query_get_pool_day_data(), columns)),
+            where=where,
+            checkpoint=self._checkpoint("poolDayDatas", resume, where, columns),
+        )
+
+    @traced
+    async def query_swaps_data(
+        self,
+        since=None,
+        until=None,
+        blocks: tuple = None,
+        pool_ids: list = None,
+        columns: list = None,
+        shards: int = 1,
+        max_concurrency: int = 4,
+        resume: bool = False,
+        limit=None,
+    ) -> "JSON":
+        where = self._where("swaps", since, until, blocks, pool_ids)
+        if shards <= 1:
+            return await query_until_end(
+                self._client,
+                gql(self._project(self._query_get_swaps(), columns)),
+                where=where,
+                checkpoint=self._checkpoint("swaps", resume, where, columns),
+            )
+
+        # the shard windows replace the timestamp filter, so they are clamped
+        # to the requested range instead.
+        async with limit or contextlib.nullcontext():
+            bounds = await query_bounds(self._client, "swaps", "timestamp")
+        if bounds is None:
+            return {"swaps": []}
+        start = bounds[0] if since is None else max(bounds[0], _unix(since))
+        end = bounds[1] if until is None else min(bounds[1], _unix(until))
+        if start >= end:
+            return {"swaps": []}
+
+        return await query_until_end_sharded(
+            self._client,
+            gql(self._project(self._query_get_swaps(), columns)),
+            "timestamp",
+            start,
+            end,
+            shards=shards,
+            max_concurrency=max_concurrency,
+            where=where,
+            checkpoint=self._checkpoint_path(
+                self._checkpoint_name("swaps-sharded", where, columns), resume
+            ),
+            resume=resume,
+            limit=limit,
+        )
+
+    @traced
+    async def query_batched(
+        self, shards: int = 1, max_parts: int = 8, swaps: bool = True
+    ) -> tuple:
+        # pages pools, exchange day data, pool day data and swaps (split into
+        # `shards` timestamp windows) together, one aliased document per
+        # request. returns what the four query_* methods return, with None for
+        # the swaps when `swaps` is off.
+        parts = [
+            (self._query_get_pools(), {}),
+            (self._query_get_exchange_day_data(), {}),
+            (self._query_get_pool_day_data(), {}),
+        ]
+        if not swaps:
+            pass
+        elif shards <= 1:
+            parts.append((self._query_get_swaps(), {}))
+        else:
+            bounds = await query_bounds(self._client, "swaps", "timestamp")
+            for lo, hi in split_range(*bounds, shards) if bounds else []:
+                parts.append(
+                    (
+                        self._query_get_swaps(),
+                        {"timestamp_gte": str(lo), "timestamp_lt": str(hi)},
+                    )
+                )
+
+        results = await query_until_end_batched(
+            self._client, parts, max_parts=max_parts
+        )
+        if not swaps:
+            return (*results, None)
+
+        swaps = [row for result in results[3:] for row in result["swaps"]]
+        return (*results[:3], {"swaps": swaps})
+
+    @traced
+    async def fetch_pool_day_by_pool(
+        self,
+        pool_ids: list = None,
+        max_concurrency: int = 8,
+        window_rows: int = FANOUT_WINDOW_ROWS,
+    ) -> pd.DataFrame:
+        # fans out over pools (by default every pool of `query_pools`) instead
+        # of paging each entity globally. day data is fetched for groups of
+        # pools first; its daily transaction counts then cut the swaps into
+        # windows of about `window_rows`: quiet pools share a window, hot pools
+        # are split by time. all requests run over one session, at most
+        # `max_concurrency` at once, and the result has the shape of
+        # `get_df_pool_day`.
+        if pool_ids is None:
+            pool_ids = [
+                pool["id"] for pool in (await self.query_pools(columns=[]))["pools"]
+            ]
+        pool_ids = [pool_id.lower() for pool_id in pool_ids]
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+        page_size = PageSizeController()
+
+        async with connect(self._client) as session:
+
+            async def fetch(query, normalize, where):
+                async with semaphore:
+                    return [
+                        normalize(data)
+                        async for _, data in iter_pages(
+                            session, gql(query), where=where, page_size=page_size
+                        )
+                        if data
+                    ]
+
+            async def fetch_all(query, normalize, wheres):
+                results = await asyncio.gather(
+                    *[fetch(query, normalize, where) for where in wheres]
+                )
+                chunks = [chunk for result in results for chunk in result]
+                return concat_frames(chunks) if chunks else normalize([])
+
+            df_pool_day_data = await fetch_all(
+                self._query_get_pool_day_data(),
+                self._normalize_pool_day_data,
+                [
+                    self._where(
+                        "poolDayDatas",
+                        pool_ids=pool_ids[start : start + FANOUT_POOLS_PER_REQUEST],
+                    )
+                    for start in range(0, len(pool_ids), FANOUT_POOLS_PER_REQUEST)
+                ],
+            )
+            df_swaps = await fetch_all(
+                self._query_get_swaps(),
+                self._normalize_swaps,
+                [
+                    self._where("swaps", since, until, pool_ids=window_pool_ids)
+                    for window_pool_ids, since, until in self._swap_windows(
+                        df_pool_day_data, pool_ids, window_rows
+                    )
+                ],
+            )
+
+        return self.get_df_pool_day(
+            df_pool_day_data, self.get_df_swaps_by_pool(df_swaps)
+        )
+
+    def _swap_windows(
+        self, df_pool_day_data: pd.DataFrame, pool_ids: list, window_rows: int
+    ) -> list:
+        # (pool ids, since, until) per request. a hot pool is cut at day starts;
+        # its first and last windows are left open, so swaps outside the days
+        # with day data are still fetched.
+        days = {
+            pool_id: df.sort_values("date")
+            for pool_id, df in df_pool_day_data.groupby("poolId", observed=True)
+        }
+        windows = []
+        batch, batch_rows = [], 0
+        for pool_id in pool_ids:
+            df = days.get(pool_id)
+            rows = 0 if df is None else int(df["dailyTransactions"].sum())
+            if rows <= window_rows:
+                batch.append(pool_id)
+                batch_rows += rows
+                if batch_rows >= window_rows or len(batch) >= FANOUT_POOLS_PER_REQUEST:
+                    windows.append((batch, None, None))
+                    batch, batch_rows = [], 0
+                continue
+
+            since, rows = None, 0
+            for date, count in zip(df["date"], df["dailyTransactions"]):
+                if rows and rows + count > window_rows:
+                    until = int(pd.Timestamp(date, tz="utc").timestamp())
+                    windows.append(([pool_id], since, until))
+                    since, rows = until, 0
+                rows += count
+            windows.append(([pool_id], since, None))
+
+        if batch:
+            windows.append((batch, None, None))
+
+        return windows
+
+    @traced
+    def parse_exchange_day_data(self, data: "JSON") -> pd.DataFrame:
+        return self._aggregate_exchange_day_data(
+            self._normalize_exchange_day_data(data["exchangeDayDatas"])
         )
 
-    async def query_pool_day_data(self) -> "JSON":
-        return await query_until_end(self._client, gql(self._query_get_pool_day_data()))
+    def _aggregate_exchange_day_data(self, df: pd.DataFrame) -> pd.DataFrame:
+        # a projected crawl may leave out any of the daily columns, so only
+        # the totals of the columns present are added
+        df.sort_values(by="date", ascending=True, inplace=True)
+        for total, daily in self._exchange_day_totals.items():
+            if daily in df:
+                df[total] = df[daily].cumsum()
+        if "totalTransactions" in df:
+            df["dailyTransactions"] = df["totalTransactions"] - df[
+                "totalTransactions"
+            ].shift(1).fillna(0).astype(int)
+        df.set_index("date", inplace=True)
+        df.index = pd.DatetimeIndex(df.index, tz="utc")
+
+        return df
+
+    @traced
+    def parse_pool_day_data(self, data: "JSON") -> pd.DataFrame:
+        return self._normalize_pool_day_data(data["poolDayDatas"])
+
+    @traced
+    def parse_swaps_frame(self, data: "JSON") -> pd.DataFrame:
+        # to get both swap aggregations of one response, build the typed frame
+        # once and pass it to `get_df_swaps` and `get_df_swaps_by_pool`,
+        # instead of normalizing the same json twice.
+        return self._normalize_swaps(data["swaps"])
+
+    @traced
+    def parse_swaps_data(self, data: "JSON") -> pd.DataFrame:
+        return self.get_df_swaps(self.parse_swaps_frame(data))
+
+    @traced
+    def parse_swaps_data_by_pool(self, data: "JSON") -> pd.DataFrame:
+        return self.get_df_swaps_by_pool(self.parse_swaps_frame(data))
+
+    def _normalize_swaps(self, data: "JSON") -> pd.DataFrame:
+        float_columns = self._swaps_float_columns
+        int_columns = [
+            "block",
+            "timestamp",
+        ]
+        df = decode_records(
+            data,
+            selection_paths(self._query_get_swaps()),
+            float_columns=float_columns,
+            int_columns=int_columns,
+            category_columns=["pool_id", "from"],
+            rename={
+                "block.block": "block",
+                "block.blockNumber": "block",
+                "poolId.id": "pool_id",
+            },
+        )
+        df["datetime"] = pd.to_datetime(df["timestamp"], utc=True, unit="s")
+        df.drop(columns="timestamp", inplace=True)
+
+        return df
+
+    def _timestamp_filter(self, entity: str, op: str, value: int) -> dict:
+        # `date` is an Int on every day entity, timestamps are BigInt strings
+        field = self._timestamp_fields[entity]
+        return {f"{field}_{op}": value if field == "date" else str(value)}
+
+    async def _iter_chunks(self, query: str, normalize, where: dict = None):
+        # each page is typed into a chunk as soon as it arrives and its raw
+        # dicts are dropped, so peak memory is the typed frame plus one page.
+        if self._executor is not None:
+            async for chunk in self._iter_chunks_in_executor(query, normalize, where):
+                yield chunk
+            return
+
+        async for _, data in iter_pages(self._client, gql(query), where=where):
+            if data:
+                yield normalize(data)
+
+    async def _iter_chunks_in_executor(self, query: str, normalize, where: dict = None):
+        # pages are collected into batches that the executor (a thread or
+        # process pool) types while the crawl goes on. chunks come out in page
+        # order, and the crawl pauses while too many batches are in flight.
+        loop = asyncio.get_running_loop()
+        pending = collections.deque()
+        batch = []
+
+        def submit(batch):
+            args = (_normalize_batch, type(self), normalize.__name__, batch)
+            if isinstance(self._executor, ThreadPoolExecutor):
+                # carries the current span over, so the worker's stages nest
+                # under it instead of each starting a trace of its own
+                args = (contextvars.copy_context().run, *args)
+            pending.append(loop.run_in_executor(self._executor, *args))
+
+        try:
+            async for _, data in iter_pages(self._client, gql(query), where=where):
+                batch.extend(data)
+                if len(batch) >= PARSE_BATCH_ROWS:
+                    submit(batch)
+                    batch = []
+                while pending and (
+                    pending[0].done() or len(pending) >= PARSE_MAX_PENDING
+                ):
+                    yield await pending.popleft()
+            if batch:
+                submit(batch)
+            while pending:
+                yield await pending.popleft()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def _parse_pages(self, query: str, normalize, entity: str) -> pd.DataFrame:
+        # an entity without rows, e.g. on a first run against an empty store,
+        # gives the empty frame of its normalizer
+        if self._store is not None:
+            await self._update_store(query, normalize, entity)
+            df = self._store.read(entity)
+            return normalize([]) if df is None else df
+
+        chunks = [chunk async for chunk in self._iter_chunks(query, normalize)]
+        return concat_frames(chunks) if chunks else normalize([])
+
+    async def _update_store(self, query: str, normalize, entity: str) -> None:
+        # only rows at or after the stored high-water mark are fetched and
+        # merged into the store.
+        where = {}
+        high_water_mark = self._store.high_water_mark(entity)
+        if high_water_mark is not None:
+            where = self._timestamp_filter(entity, "gte", high_water_mark)
+
+        chunks = [chunk async for chunk in self._iter_chunks(query, normalize, where)]
+        if not chunks:
+            return
+
+        df = concat_frames(chunks)
+        if "datetime" in df:
+            day = df["datetime"].dt.date
+            high_water_mark = int(df["datetime"].max().timestamp())
+        else:
+            day = df["date"]
+            high_water_mark = int(pd.Timestamp(day.max(), tz="utc").timestamp())
+        self._store.upsert(entity, df, day, high_water_mark)
+
+    @traced
+    async def stream_pools_data(self) -> pd.DataFrame:
+        return await self._parse_pages(
+            self._query_get_pools(), self._normalize_pools, "pools"
+        )
+
+    @traced
+    async def stream_exchange_day_data(self) -> pd.DataFrame:
+        return self._aggregate_exchange_day_data(
+            await self._parse_pages(
+                self._query_get_exchange_day_data(),
+                self._normalize_exchange_day_data,
+                "exchangeDayDatas",
+            )
+        )
+
+    @traced
+    async def stream_pool_day_data(self) -> pd.DataFrame:
+        return await self._parse_pages(
+            self._query_get_pool_day_data(),
+            self._normalize_pool_day_data,
+            "poolDayDatas",
+        )
+
+    @traced
+    async def stream_swaps_frame(self) -> pd.DataFrame:
+        return await self._parse_pages(
+            self._query_get_swaps(), self._normalize_swaps, "swaps"
+        )
+
+    @traced
+    async def stream_swaps_data(self) -> pd.DataFrame:
+        return self.get_df_swaps(await self.stream_swaps_frame())
+
+    @traced
+    async def stream_swaps_data_by_pool(self) -> pd.DataFrame:
+        return self.get_df_swaps_by_pool(await self.stream_swaps_frame())
+
+    async def follow(
+        self,
+        df_swaps: pd.DataFrame = None,
+        interval: float = 10.0,
+        since_block: int = None,
+    ):
+        # tails the subgraph: every `interval` seconds, the pools and swaps of
+        # the blocks indexed since the previous poll are fetched and yielded as
+        # typed `(df_pools, df_swaps)` deltas, None where a block range had no
+        # rows. a subgraph indexes whole blocks, so nothing is missed or seen
+        # twice. with `df_swaps` (a `get_df_swaps` frame), its daily counters
+        # are updated in place. starts after the current head unless
+        # `since_block` is given.
+        if since_block is None:
+            last_block = await query_head_block(self._client)
+        else:
+            last_block = since_block - 1
+
+        while True:
+            head = await query_head_block(self._client)
+            if head > last_block:
+                blocks = (last_block + 1, head + 1)
+                deltas = []
+                for entity, query, normalize in [
+                    ("pools", self._query_get_pools(), self._normalize_pools),
+                    ("swaps", self._query_get_swaps(), self._normalize_swaps),
+                ]:
+                    chunks = [
+                        chunk
+                        async for chunk in self._iter_chunks(
+                            query, normalize, self._where(entity, blocks=blocks)
+                        )
+                    ]
+                    deltas.append(concat_frames(chunks) if chunks else None)
+                last_block = head
+
+                if df_swaps is not None and deltas[1] is not None:
+                    self._update_daily_swaps(df_swaps, deltas[1])
+                if deltas[0] is not None or deltas[1] is not None:
+                    yield tuple(deltas)
+
+            await asyncio.sleep(interval)
+
+    def _update_daily_swaps(self, df_swaps: pd.DataFrame, df: pd.DataFrame) -> None:
+        # days past the end of `df_swaps` are appended as zero rows first, so
+        # the index stays a gapless daily range.
+        daily = self._daily_swaps(df)
+        for day in pd.date_range(df_swaps.index.max(), daily.index.max())[1:]:
+            df_swaps.loc[day] = 0
+        for column in daily:
+            if column in df_swaps:
+                df_swaps.loc[daily.index, column] += daily[column]
+        for column, total in self._totals.items():
+            if total in df_swaps:
+                df_swaps[total] = df_swaps[column].cumsum()
+
+    @traced
+    def get_df_swaps(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self._reindex(self._daily_swaps(df))
+
+    def _daily_swaps(self, df: pd.DataFrame, freq: str = "D") -> pd.DataFrame:
+        return df.groupby(pd.Grouper(key="datetime", axis=0, freq=freq)).agg(
+            **self._swap_aggregations(df)
+        )
+
+    def _swap_aggregations(self, df: pd.DataFrame) -> dict:
+        aggregations = {"new_swap_count": ("id", "count")}
+        if "amountFeeUSD" in df:
+            aggregations["daily_fee_in_usd"] = ("amountFeeUSD", "sum")
+
+        return aggregations
+
+    @traced
+    def get_df_swaps_by_pool(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self._cumsum_by_pool(self._daily_swaps_by_pool(df))
+
+    def _daily_swaps_by_pool(self, df: pd.DataFrame) -> pd.DataFrame:
+        return (
+            df.groupby(
+                [
+                    "pool_id",
+                    df["datetime"].dt.date.rename("date"),
+                ],
+                observed=True,
+            )
+            .agg(**self._swap_aggregations(df))
+            .reset_index()
+        )
+
+    def _cumsum_by_pool(self, df: pd.DataFrame) -> pd.DataFrame:
+        df["total_swap_count"] = df.groupby(["pool_id"], observed=True)[
+            "new_swap_count"
+        ].cumsum()
+        if "daily_fee_in_usd" in df:
+            df["total_fee_in_usd"] = df.groupby(["pool_id"], observed=True)[
+                "daily_fee_in_usd"
+            ].cumsum()
+
+        return df
+
+    def _fold_aggregate(self, name: str, entity: str, fold) -> pd.DataFrame:
+        # aggregates persisted in the store remember the newest row folded into
+        # them, so a refresh only reads the partitions from that day on and
+        # folds the rows after it. rows of one timestamp are indexed together,
+        # so nothing at or before it can show up later.
+        if self._store is None:
+            raise ValueError("incremental aggregates need a store")
+
+        aggregate = self._store.read_aggregate(name)
+        folded_until = None
+        if aggregate is not None:
+            folded_until = pd.Timestamp(
+                aggregate.attrs["folded_until"], unit="s", tz="utc"
+            )
+
+        df = self._store.read(
+            entity, since=None if folded_until is None else folded_until.date()
+        )
+        if df is not None and folded_until is not None:
+            df = df[df["datetime"] > folded_until]
+
+        if df is not None and not df.empty:
+            aggregate = fold(aggregate, df)
+            aggregate.attrs["folded_until"] = int(df["datetime"].max().timestamp())
+            self._store.write_aggregate(name, aggregate)
+
+        if aggregate is None:
+            # nothing stored yet and no rows to fold: the empty aggregate of the
+            # entity's typed frame, which is not persisted
+            normalize = {"pools": self._normalize_pools, "swaps": self._normalize_swaps}
+            aggregate = fold(None, normalize[entity]([]))
+
+        return aggregate
+
+    def _sum_aggregate(self, aggregate: pd.DataFrame, df: pd.DataFrame) -> pd.DataFrame:
+        if aggregate is None:
+            return df
+
+        return (
+            pd.concat([aggregate, df])
+            .groupby(level=list(range(df.index.nlevels)))
+            .sum()
+        )
+
+    @traced
+    async def update_df_pools(self) -> pd.DataFrame:
+        await self._update_store(
+            self._query_get_pools(), self._normalize_pools, "pools"
+        )
+        df_pools = self._fold_aggregate(
+            "pools",
+            "pools",
+            lambda aggregate, df: self._sum_aggregate(aggregate, self._daily_pools(df)),
+        )
+
+        return self._reindex(df_pools)
+
+    @traced
+    async def update_df_tokens(self) -> pd.DataFrame:
+        # the persisted state is every token with the first time it was seen;
+        # a token counts as new on the day of its first pool.
+        def fold(aggregate, df):
+            df_tokens = pd.concat(
+                [
+                    pd.DataFrame(
+                        {"token_id": df[column].astype(str), "first": df["datetime"]}
+                    )
+                    for column in ["token0.id", "token1.id"]
+                ]
+            )
+            if aggregate is not None:
+                df_tokens = pd.concat([aggregate.reset_index(), df_tokens])
+
+            return df_tokens.groupby("token_id").agg(first=("first", "min"))
+
+        await self._update_store(
+            self._query_get_pools(), self._normalize_pools, "pools"
+        )
+        df_tokens = self._fold_aggregate("tokens", "pools", fold)
+        df_tokens = df_tokens.groupby(pd.Grouper(key="first", axis=0, freq="D")).agg(
+            new_token_count=("first", "count")
+        )
+
+        return self._reindex(df_tokens)
+
+    @traced
+    async def update_df_swaps(self) -> pd.DataFrame:
+        await self._update_store(
+            self._query_get_swaps(), self._normalize_swaps, "swaps"
+        )
+        df_swaps = self._fold_aggregate(
+            "swaps",
+            "swaps",
+            lambda aggregate, df: self._sum_aggregate(aggregate, self._daily_swaps(df)),
+        )
+
+        return self._reindex(df_swaps)
+
+    @traced
+    async def update_df_swaps_by_pool(self) -> pd.DataFrame:
+        def fold(aggregate, df):
+            df = self._daily_swaps_by_pool(df)
+            df["pool_id"] = df["pool_id"].astype(str)
+
+            return self._sum_aggregate(aggregate, df.set_index(["pool_id", "date"]))
+
+        await self._update_store(
+            self._query_get_swaps(), self._normalize_swaps, "swaps"
+        )
+        df = self._fold_aggregate("swaps_by_pool", "swaps", fold).reset_index()
+        df["pool_id"] = df["pool_id"].astype("category")
+
+        return self._cumsum_by_pool(df)
+
+    # unique traders are the distinct `from` wallets of the swaps. a wallet is
+    # a new trader on the day of its first swap (per pool in the by-pool view),
+    # so `total_trader_count` is the running distinct count. the approximate
+    # mode counts with hyperloglog sketches of 2**precision bytes per day (or
+    # pool and day), whose relative error is about 1.04 / sqrt(2**precision).
+    @traced
+    def get_df_traders(
+        self, df: pd.DataFrame, approximate: bool = False, precision: int = 12
+    ) -> pd.DataFrame:
+        day = df["datetime"].dt.floor("D")
+        if approximate:
+            days, groups = np.unique(
+                df["datetime"].values.astype("datetime64[D]"), return_inverse=True
+            )
+            registers = sketch.sketch(
+                self._trader_hashes(df), groups, len(days), precision
+            )
+            df_traders = self._traders_from_sketches(
+                registers, pd.DatetimeIndex(days).tz_localize("utc")
+            )
+        else:
+            df_traders = pd.DataFrame(
+                {
+                    "daily_trader_count": df.groupby(day)["from"].nunique(),
+                    "new_trader_count": df.groupby("from", observed=True)["datetime"]
+                    .min()
+                    .dt.floor("D")
+                    .value_counts(),
+                }
+            )
+            df_traders = df_traders.fillna(0).astype(int)
+
+        return self._reindex(df_traders)
+
+    @traced
+    def get_df_traders_by_pool(
+        self, df: pd.DataFrame, approximate: bool = False, precision: int = 12
+    ) -> pd.DataFrame:
+        keys = ["pool_id", df["datetime"].dt.date.rename("date")]
+        if approximate:
+            grouped = df.groupby(keys, observed=True)
+            index = grouped.size().index
+            registers = sketch.sketch(
+                self._trader_hashes(df),
+                grouped.ngroup().values,
+                len(index),
+                precision,
+            )
+            daily = sketch.estimate(registers)
+            # running sketches restart at each pool, whose rows are contiguous
+            starts = np.flatnonzero(np.diff(index.codes[0], prepend=-1))
+            for start, end in zip(starts, [*starts[1:], len(index)]):
+                np.maximum.accumulate(
+                    registers[start:end], axis=0, out=registers[start:end]
+                )
+            total = pd.Series(sketch.estimate(registers), index)
+            df_traders = pd.DataFrame(
+                {
+                    "daily_trader_count": daily,
+                    "new_trader_count": total
+                    - total.groupby(level="pool_id", observed=True).shift(1).fillna(0),
+                },
+                index,
+            )
+        else:
+            first = (
+                df.groupby(["pool_id", "from"], observed=True)["datetime"]
+                .min()
+                .dt.date.rename("date")
+                .reset_index()
+            )
+            df_traders = pd.DataFrame(
+                {
+                    "daily_trader_count": df.groupby(keys, observed=True)[
+                        "from"
+                    ].nunique(),
+                    "new_trader_count": first.groupby(
+                        ["pool_id", "date"], observed=True
+                    ).size(),
+                }
+            )
+            df_traders = df_traders.fillna(0).astype(int)
+
+        df_traders.reset_index(inplace=True)
+        df_traders["total_trader_count"] = df_traders.groupby(
+            ["pool_id"], observed=True
+        )["new_trader_count"].cumsum()
+
+        return df_traders
+
+    @traced
+    async def update_df_traders(self, precision: int = 12) -> pd.DataFrame:
+        # approximate daily and running unique traders from per-day sketches
+        # kept in the store. a refresh only sketches the new swaps and merges
+        # them into the sketches of their days.
+        def fold(aggregate, df):
+            days, groups = np.unique(
+                df["datetime"].values.astype("datetime64[D]"), return_inverse=True
+            )
+            registers = sketch.sketch(
+                self._trader_hashes(df), groups, len(days), precision
+            )
+            if aggregate is not None:
+                days, registers = sketch.merge(
+                    np.concatenate([aggregate.index.values, days]),
+                    np.concatenate(
+                        [sketch.from_frame(aggregate, precision), registers]
+                    ),
+                )
+
+            return sketch.to_frame(registers, pd.Index(days, name="day"))
+
+        await self._update_store(
+            self._query_get_swaps(), self._normalize_swaps, "swaps"
+        )
+        df_sketches = self._fold_aggregate(f"traders_p{precision}", "swaps", fold)
+
+        return self._reindex(
+            self._traders_from_sketches(
+                sketch.from_frame(df_sketches, precision),
+                pd.DatetimeIndex(df_sketches.index).tz_localize("utc"),
+            )
+        )
+
+    def _trader_hashes(self, df: pd.DataFrame) -> np.ndarray:
+        # wallets are categorical, so each distinct address is hashed once
+        if isinstance(df["from"].dtype, pd.CategoricalDtype):
+            return sketch.hash_values(df["from"].cat.categories)[
+                df["from"].cat.codes.values
+            ]
+
+        return sketch.hash_values(df["from"])
+
+    def _traders_from_sketches(
+        self, registers: np.ndarray, index: pd.DatetimeIndex
+    ) -> pd.DataFrame:
+        daily = sketch.estimate(registers)
+        total = sketch.estimate(np.maximum.accumulate(registers, axis=0))
+
+        return pd.DataFrame(
+            {
+                "daily_trader_count": daily,
+                "new_trader_count": np.diff(total, prepend=0),
+            },
+            index,
+        )
+
+    # hourly base aggregates hold only additive columns (counts and sums), so
+    # `rollup` derives any coarser resolution from them without going back to
+    # the rows.
+    @traced
+    def get_hourly_pools(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self._daily_pools(df, freq="h")
+
+    @traced
+    def get_hourly_swaps(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self._daily_swaps(df, freq="h")
+
+    @traced
+    def get_hourly_swaps_by_pool(self, df: pd.DataFrame) -> pd.DataFrame:
+        return (
+            df.groupby(["pool_id", pd.Grouper(key="datetime", freq="h")], observed=True)
+            .agg(**self._swap_aggregations(df))
+            .reset_index()
+        )
+
+    @traced
+    def rollup(self, df: pd.DataFrame, freq: str) -> pd.DataFrame:
+        # `freq` is any pandas frequency from an hour up, e.g. "6h", "D", "W"
+        # or "MS". at "D" the result matches `get_df_pools` / `get_df_swaps`.
+        df = df.drop(columns=list(self._totals.values()), errors="ignore")
+
+        return self._reindex(df.resample(freq).sum(), freq)
+
+    @traced
+    def rollup_by_pool(self, df: pd.DataFrame, freq: str) -> pd.DataFrame:
+        columns = [column for column in self._totals if column in df]
+        df = (
+            df.groupby(
+                ["pool_id", pd.Grouper(key="datetime", freq=freq)], observed=True
+            )[columns]
+            .sum()
+            .reset_index()
+        )
 
-    async def query_swaps_data(self) -> "JSON":
-        return await query_until_end(self._client, gql(self._query_get_swaps()))
+        return self._cumsum_by_pool(df)
 
+    @traced
+    async def update_hourly_pools(self) -> pd.DataFrame:
+        await self._update_store(
+            self._query_get_pools(), self._normalize_pools, "pools"
+        )
+
+        return self._fold_aggregate(
+            "pools_hourly",
+            "pools",
+            lambda aggregate, df: self._sum_aggregate(
+                aggregate, self.get_hourly_pools(df)
+            ),
+        )
+
+    @traced
+    async def update_hourly_swaps(self) -> pd.DataFrame:
+        await self._update_store(
+            self._query_get_swaps(), self._normalize_swaps, "swaps"
+        )
+
+        return self._fold_aggregate(
+            "swaps_hourly",
+            "swaps",
+            lambda aggregate, df: self._sum_aggregate(
+                aggregate, self.get_hourly_swaps(df)
+            ),
+        )
+
+    @traced
+    async def update_hourly_swaps_by_pool(self) -> pd.DataFrame:
+        def fold(aggregate, df):
+            df = self.get_hourly_swaps_by_pool(df)
+            df["pool_id"] = df["pool_id"].astype(str)
+
+            return self._sum_aggregate(aggregate, df.set_index(["pool_id", "datetime"]))
+
+        await self._update_store(
+            self._query_get_swaps(), self._normalize_swaps, "swaps"
+        )
+        df = self._fold_aggregate("swaps_hourly_by_pool", "swaps", fold).reset_index()
+        df["pool_id"] = df["pool_id"].astype("category")
+
+        return df
+
+    # aggregate-only swap metrics: the shapes of `get_df_swaps` and
+    # `get_df_swaps_by_pool`, derived from the (parsed) exchange and pool day
+    # data instead of the swaps, so no swap is ever fetched. the day entities
+    # count every transaction of the day (swaps, mints and burns), so swap
+    # counts derived from them are an upper bound. fees are only available
+    # where the subgraph tracks them on its day entities.
+    @traced
+    def get_df_swaps_from_day_data(
+        self,
+        df_exchange_day_data: pd.DataFrame,
+    ) -> pd.DataFrame:
+        df = pd.DataFrame(
+            {"new_swap_count": df_exchange_day_data["dailyTransactions"]},
+        )
+        if "dailyFeeUSD" in df_exchange_day_data:
+            df["daily_fee_in_usd"] = df_exchange_day_data["dailyFeeUSD"]
+
+        return self._reindex(df)
+
+    @traced
+    def get_df_swaps_by_pool_from_day_data(
+        self,
+        df_pool_day_data: pd.DataFrame,
+    ) -> pd.DataFrame:
+        columns = {
+            "poolId": "pool_id",
+            "date": "date",
+            "dailyTransactions": "new_swap_count",
+        }
+        if "dailyFeeUSD" in df_pool_day_data:
+            columns["dailyFeeUSD"] = "daily_fee_in_usd"
+
+        df = df_pool_day_data[list(columns)].rename(columns=columns)
+        df.sort_values(by=["pool_id", "date"], ascending=True, inplace=True)
+        df.reset_index(drop=True, inplace=True)
+
+        return self._cumsum_by_pool(df)
+
+    @traced
     def get_df_exchange_day(
         self,
         df_exchange_day_data: pd.DataFrame,
@@ -68,39 +1173,66 @@ class Base:
     ) -> pd.DataFrame:
         return df_exchange_day_data.join(df_swaps_data)
 
+    @traced
     def get_df_pool_day(
         self,
         df_pool_day_data: pd.DataFrame,
         df_swaps_data_by_pool: pd.DataFrame,
     ) -> pd.DataFrame:
+        pool_ids, swap_pool_ids = unify_categories(
+            df_pool_day_data["poolId"], df_swaps_data_by_pool["pool_id"]
+        )
         df_pool_day = pd.merge(
-            df_pool_day_data,
-            df_swaps_data_by_pool,
+            df_pool_day_data.assign(poolId=pool_ids),
+            df_swaps_data_by_pool.assign(pool_id=swap_pool_ids),
             how="left",
             left_on=["poolId", "date"],
             right_on=["pool_id", "date"],
         )
         df_pool_day.drop(columns=["poolId"], inplace=True)
-        df_pool_day["totalVolumeUSD"] = df_pool_day.groupby(["pool_id"])[
-            "dailyVolumeUSD"
-        ].cumsum()
-        df_pool_day["totalTransactions"] = df_pool_day.groupby(["pool_id"])[
-            "dailyTransactions"
-        ].cumsum()
+        # projected day data may lack any of the daily columns
+        for total, daily in [
+            ("totalVolumeUSD", "dailyVolumeUSD"),
+            ("totalTransactions", "dailyTransactions"),
+        ]:
+            if daily in df_pool_day:
+                df_pool_day[total] = df_pool_day.groupby(["pool_id"], observed=True)[
+                    daily
+                ].cumsum()
         df_pool_day.set_index("date", inplace=True)
         return df_pool_day
 
 
 class SupSwapExchangeV2(Base):
+    _exchange_day_totals = {
+        "totalVolumeETH": "dailyVolumeETH",
+        "totalVolumeUSD": "dailyVolumeUSD",
+    }
+    _timestamp_fields = {
+        **Base._timestamp_fields,
+        "pools": "timestamp",
+    }
+    _block_fields = {
+        "pools": "block",
+        "swaps": "transaction.block",
+    }
+    _pool_fields = {
+        **Base._pool_fields,
+        "poolDayDatas": "pairAddress",
+        "swaps": "pair",
+    }
+
     def _query_get_pools(self) -> str:
         return """
         query getPools(
-            $skip: Int = 0,
             $first: Int = 1000,
+            $where: Pair_filter = {},
         ) {
             pools: pairs(
-                skip: $skip,
                 first: $first,
+                where: $where,
+                orderBy: id,
+                orderDirection: asc,
             ) {
                 id
                 token0 {
@@ -124,12 +1256,14 @@ class SupSwapExchangeV2(Base):
     def _query_get_exchange_day_data(self) -> str:
         return """
         query getExchangeDayDatas(
-            $skip: Int = 0,
             $first: Int = 1000,
+            $where: SupDayData_filter = {},
         ) {
             exchangeDayDatas: supDayDatas(
-                skip: $skip,
                 first: $first,
+                where: $where,
+                orderBy: id,
+                orderDirection: asc,
             ) {
                 id
                 date
@@ -146,8 +1280,7 @@ class SupSwapExchangeV2(Base):
         }
         """
 
-    def parse_exchange_day_data(self, data: "JSON") -> pd.DataFrame:
-        df = pd.json_normalize(data=data["exchangeDayDatas"])
+    def _normalize_exchange_day_data(self, data: "JSON") -> pd.DataFrame:
         float_columns = [
             "dailyVolumeETH",
             "dailyVolumeUSD",
@@ -160,29 +1293,27 @@ class SupSwapExchangeV2(Base):
             "date",
             "totalTransactions",
         ]
-        df[float_columns] = df[float_columns].astype(float)
-        df[int_columns] = df[int_columns].astype(int)
+        df = decode_records(
+            data,
+            selection_paths(self._query_get_exchange_day_data()),
+            float_columns=float_columns,
+            int_columns=int_columns,
+        )
         df["date"] = pd.to_datetime(df["date"], utc=True, unit="s").dt.date
-        df.sort_values(by="date", ascending=True, inplace=True)
-        df["totalVolumeETH"] = df["dailyVolumeETH"].cumsum()
-        df["totalVolumeUSD"] = df["dailyVolumeUSD"].cumsum()
-        df["dailyTransactions"] = df["totalTransactions"] - df[
-            "totalTransactions"
-        ].shift(1).fillna(0).astype(int)
-        df.set_index("date", inplace=True)
-        df.index = pd.DatetimeIndex(df.index, tz="utc")
 
         return df
 
     def _query_get_pool_day_data(self) -> str:
         return """
         query getPoolDayDatas(
-            $skip: Int = 0,
             $first: Int = 1000,
+            $where: PairDayData_filter = {},
         ) {
             poolDayDatas: pairDayDatas(
-                skip: $skip,
                 first: $first,
+                where: $where,
+                orderBy: id,
+                orderDirection: asc,
             ) {
                 id
                 date
@@ -200,8 +1331,7 @@ class SupSwapExchangeV2(Base):
         }
         """
 
-    def parse_pool_day_data(self, data: "JSON") -> pd.DataFrame:
-        df = pd.json_normalize(data=data["poolDayDatas"])
+    def _normalize_pool_day_data(self, data: "JSON") -> pd.DataFrame:
         float_columns = [
             "totalLiquidityUSD",
             "dailyVolumeUSD",
@@ -210,8 +1340,13 @@ class SupSwapExchangeV2(Base):
             "date",
             "dailyTransactions",
         ]
-        df[float_columns] = df[float_columns].astype(float)
-        df[int_columns] = df[int_columns].astype(int)
+        df = decode_records(
+            data,
+            selection_paths(self._query_get_pool_day_data()),
+            float_columns=float_columns,
+            int_columns=int_columns,
+            category_columns=["poolId"],
+        )
         df["date"] = pd.to_datetime(df["date"], utc=True, unit="s").dt.date
 
         return df
@@ -219,12 +1354,14 @@ class SupSwapExchangeV2(Base):
     def _query_get_swaps(self) -> str:
         return """
         query getSwaps(
-            $skip: Int = 0,
             $first: Int = 1000,
+            $where: Swap_filter = {},
         ) {
             swaps: swaps(
-                skip: $skip,
                 first: $first,
+                where: $where,
+                orderBy: id,
+                orderDirection: asc,
             ) {
                 id
                 block: transaction {
@@ -240,81 +1377,19 @@ class SupSwapExchangeV2(Base):
         }
         """
 
-    def parse_swaps_data(self, data: "JSON") -> pd.DataFrame:
-        df = pd.json_normalize(data=data["swaps"])
-        float_columns = [
-            "amountFeeUSD",
-        ]
-        int_columns = [
-            "timestamp",
-        ]
-        df[float_columns] = df[float_columns].astype(float)
-        df[int_columns] = df[int_columns].astype(int)
-        df["datetime"] = pd.to_datetime(df["timestamp"], utc=True, unit="s")
-        df.drop(columns="timestamp", inplace=True)
-
-        df = df.groupby(pd.Grouper(key="datetime", axis=0, freq="D")).agg(
-            new_swap_count=("id", "count"),
-            daily_fee_in_usd=("amountFeeUSD", "sum"),
-        )
-        idx = pd.date_range(df.index.min(), pd.Timestamp.utcnow())
-        df = df.reindex(idx, fill_value=0)
-        df.sort_index(ascending=True, inplace=True)
-        df["total_swap_count"] = df["new_swap_count"].cumsum()
-        df["total_fee_in_usd"] = df["daily_fee_in_usd"].cumsum()
-
-        return df
-
-    def parse_swaps_data_by_pool(self, data: "JSON") -> pd.DataFrame:
-        df = pd.json_normalize(data=data["swaps"])
-        df.rename(
-            columns={
-                "block.block": "block",
-                "poolId.id": "pool_id",
-            },
-            inplace=True,
-        )
-        float_columns = [
-            "amountFeeUSD",
-        ]
-        int_columns = [
-            "timestamp",
-        ]
-        df[float_columns] = df[float_columns].astype(float)
-        df[int_columns] = df[int_columns].astype(int)
-        df["date"] = pd.to_datetime(df["timestamp"], utc=True, unit="s").dt.date
-        df.drop(columns="timestamp", inplace=True)
-
-        df = (
-            df.groupby(
-                [
-                    "pool_id",
-                    "date",
-                ]
-            )
-            .agg(
-                new_swap_count=("id", "count"),
-                daily_fee_in_usd=("amountFeeUSD", "sum"),
-            )
-            .reset_index()
-        )
-
-        df["total_swap_count"] = df.groupby(["pool_id"])["new_swap_count"].cumsum()
-        df["total_fee_in_usd"] = df.groupby(["pool_id"])["daily_fee_in_usd"].cumsum()
-
-        return df
-
 
 class SupSwapExchangeV3(Base):
     def _query_get_pools(self) -> str:
         return """
         query getPools(
-            $skip: Int = 0,
             $first: Int = 1000,
+            $where: Pool_filter = {},
         ) {
             pools: pools(
-                skip: $skip,
                 first: $first,
+                where: $where,
+                orderBy: id,
+                orderDirection: asc,
             ) {
                 id
                 token0 {
@@ -338,12 +1413,14 @@ class SupSwapExchangeV3(Base):
     def _query_get_exchange_day_data(self) -> str:
         return """
         query getExchangeDayDatas(
-            $skip: Int = 0,
             $first: Int = 1000,
+            $where: SupDayData_filter = {},
         ) {
             exchangeDayDatas: supDayDatas(
-                skip: $skip,
                 first: $first,
+                where: $where,
+                orderBy: id,
+                orderDirection: asc,
             ) {
                 id
                 date
@@ -360,8 +1437,7 @@ class SupSwapExchangeV3(Base):
         }
         """
 
-    def parse_exchange_day_data(self, data: "JSON") -> pd.DataFrame:
-        df = pd.json_normalize(data=data["exchangeDayDatas"])
+    def _normalize_exchange_day_data(self, data: "JSON") -> pd.DataFrame:
         float_columns = [
             "dailyFeeUSD",
             "dailyVolumeETH",
@@ -374,30 +1450,27 @@ class SupSwapExchangeV3(Base):
             "date",
             "totalTransactions",
         ]
-        df[float_columns] = df[float_columns].astype(float)
-        df[int_columns] = df[int_columns].astype(int)
+        df = decode_records(
+            data,
+            selection_paths(self._query_get_exchange_day_data()),
+            float_columns=float_columns,
+            int_columns=int_columns,
+        )
         df["date"] = pd.to_datetime(df["date"], utc=True, unit="s").dt.date
-        df.sort_values(by="date", ascending=True, inplace=True)
-        df["totalVolumeETH"] = df["dailyVolumeETH"].cumsum()
-        df["totalVolumeUSD"] = df["dailyVolumeUSD"].cumsum()
-        df["totalFeeUSD"] = df["dailyFeeUSD"].cumsum()
-        df["dailyTransactions"] = df["totalTransactions"] - df[
-            "totalTransactions"
-        ].shift(1).fillna(0).astype(int)
-        df.set_index("date", inplace=True)
-        df.index = pd.DatetimeIndex(df.index, tz="utc")
 
         return df
 
     def _query_get_pool_day_data(self) -> str:
         return """
         query getPoolDayDatas(
-            $skip: Int = 0,
             $first: Int = 1000,
+            $where: PoolDayData_filter = {},
         ) {
             poolDayDatas: poolDayDatas(
-                skip: $skip,
                 first: $first,
+                where: $where,
+                orderBy: id,
+                orderDirection: asc,
             ) {
                 id
                 date
@@ -417,9 +1490,7 @@ class SupSwapExchangeV3(Base):
         }
         """
 
-    def parse_pool_day_data(self, data: "JSON") -> pd.DataFrame:
-        df = pd.json_normalize(data=data["poolDayDatas"])
-        df.rename(columns={"poolId.id": "poolId"}, inplace=True)
+    def _normalize_pool_day_data(self, data: "JSON") -> pd.DataFrame:
         float_columns = [
             "totalLiquidityUSD",
             "dailyVolumeUSD",
@@ -429,8 +1500,14 @@ class SupSwapExchangeV3(Base):
             "date",
             "dailyTransactions",
         ]
-        df[float_columns] = df[float_columns].astype(float)
-        df[int_columns] = df[int_columns].astype(int)
+        df = decode_records(
+            data,
+            selection_paths(self._query_get_pool_day_data()),
+            float_columns=float_columns,
+            int_columns=int_columns,
+            category_columns=["poolId"],
+            rename={"poolId.id": "poolId"},
+        )
         df["date"] = pd.to_datetime(df["date"], utc=True, unit="s").dt.date
 
         return df
@@ -438,12 +1515,14 @@ class SupSwapExchangeV3(Base):
     def _query_get_swaps(self) -> str:
         return """
         query getSwaps(
-            $skip: Int = 0,
             $first: Int = 1000,
+            $where: Swap_filter = {},
         ) {
             swaps: swaps(
-                skip: $skip,
                 first: $first,
+                where: $where,
+                orderBy: id,
+                orderDirection: asc,
             ) {
                 id
                 block: transaction {
@@ -459,81 +1538,30 @@ class SupSwapExchangeV3(Base):
         }
         """
 
-    def parse_swaps_data(self, data: "JSON") -> pd.DataFrame:
-        df = pd.json_normalize(data=data["swaps"])
-        float_columns = [
-            "amountFeeUSD",
-        ]
-        int_columns = [
-            "timestamp",
-        ]
-        df[float_columns] = df[float_columns].astype(float)
-        df[int_columns] = df[int_columns].astype(int)
-        df["datetime"] = pd.to_datetime(df["timestamp"], utc=True, unit="s")
-        df.drop(columns="timestamp", inplace=True)
-
-        df = df.groupby(pd.Grouper(key="datetime", axis=0, freq="D")).agg(
-            new_swap_count=("id", "count"),
-            daily_fee_in_usd=("amountFeeUSD", "sum"),
-        )
-        idx = pd.date_range(df.index.min(), pd.Timestamp.utcnow())
-        df = df.reindex(idx, fill_value=0)
-        df.sort_index(ascending=True, inplace=True)
-        df["total_swap_count"] = df["new_swap_count"].cumsum()
-        df["total_fee_in_usd"] = df["daily_fee_in_usd"].cumsum()
-
-        return df
-
-    def parse_swaps_data_by_pool(self, data: "JSON") -> pd.DataFrame:
-        df = pd.json_normalize(data=data["swaps"])
-        df.rename(
-            columns={
-                "block.block": "block",
-                "poolId.id": "pool_id",
-            },
-            inplace=True,
-        )
-        float_columns = [
-            "amountFeeUSD",
-        ]
-        int_columns = [
-            "timestamp",
-        ]
-        df[float_columns] = df[float_columns].astype(float)
-        df[int_columns] = df[int_columns].astype(int)
-        df["date"] = pd.to_datetime(df["timestamp"], utc=True, unit="s").dt.date
-        df.drop(columns="timestamp", inplace=True)
-
-        df = (
-            df.groupby(
-                [
-                    "pool_id",
-                    "date",
-                ]
-            )
-            .agg(
-                new_swap_count=("id", "count"),
-                daily_fee_in_usd=("amountFeeUSD", "sum"),
-            )
-            .reset_index()
-        )
-
-        df["total_swap_count"] = df.groupby(["pool_id"])["new_swap_count"].cumsum()
-        df["total_fee_in_usd"] = df.groupby(["pool_id"])["daily_fee_in_usd"].cumsum()
-
-        return df
-
 
 class KimAmm(Base):
+    _swaps_float_columns = []
+    _exchange_day_totals = {
+        **Base._exchange_day_totals,
+        "totalFeeETH": "dailyFeeETH",
+    }
+    _pool_fields = {
+        **Base._pool_fields,
+        "poolDayDatas": "pairAddress",
+        "swaps": "pair",
+    }
+
     def _query_get_pools(self) -> str:
         return """
         query getPools(
-            $skip: Int = 0,
             $first: Int = 1000,
+            $where: Pair_filter = {},
         ) {
             pools: pairs(
-                skip: $skip,
                 first: $first,
+                where: $where,
+                orderBy: id,
+                orderDirection: asc,
             ) {
                 id
                 token0 {
@@ -557,12 +1585,14 @@ class KimAmm(Base):
     def _query_get_exchange_day_data(self) -> str:
         return """
         query getExchangeDayDatas(
-            $skip: Int = 0,
             $first: Int = 1000,
+            $where: UniswapDayData_filter = {},
         ) {
             exchangeDayDatas: uniswapDayDatas(
-                skip: $skip,
                 first: $first,
+                where: $where,
+                orderBy: id,
+                orderDirection: asc,
             ) {
                 id
                 date
@@ -579,8 +1609,7 @@ class KimAmm(Base):
         }
         """
 
-    def parse_exchange_day_data(self, data: "JSON") -> pd.DataFrame:
-        df = pd.json_normalize(data=data["exchangeDayDatas"])
+    def _normalize_exchange_day_data(self, data: "JSON") -> pd.DataFrame:
         float_columns = [
             "dailyVolumeETH",
             "dailyVolumeUSD",
@@ -595,31 +1624,27 @@ class KimAmm(Base):
             "date",
             "totalTransactions",
         ]
-        df[float_columns] = df[float_columns].astype(float)
-        df[int_columns] = df[int_columns].astype(int)
+        df = decode_records(
+            data,
+            selection_paths(self._query_get_exchange_day_data()),
+            float_columns=float_columns,
+            int_columns=int_columns,
+        )
         df["date"] = pd.to_datetime(df["date"], utc=True, unit="s").dt.date
-        df.sort_values(by="date", ascending=True, inplace=True)
-        df["totalVolumeETH"] = df["dailyVolumeETH"].cumsum()
-        df["totalVolumeUSD"] = df["dailyVolumeUSD"].cumsum()
-        df["totalFeeUSD"] = df["dailyFeeUSD"].cumsum()
-        df["totalFeeETH"] = df["dailyFeeETH"].cumsum()
-        df["dailyTransactions"] = df["totalTransactions"] - df[
-            "totalTransactions"
-        ].shift(1).fillna(0).astype(int)
-        df.set_index("date", inplace=True)
-        df.index = pd.DatetimeIndex(df.index, tz="utc")
 
         return df
 
     def _query_get_pool_day_data(self) -> str:
         return """
         query getPoolDayDatas(
-            $skip: Int = 0,
             $first: Int = 1000,
+            $where: PairDayData_filter = {},
         ) {
             poolDayDatas: pairDayDatas(
-                skip: $skip,
                 first: $first,
+                where: $where,
+                orderBy: id,
+                orderDirection: asc,
             ) {
                 id
                 date
@@ -637,8 +1662,7 @@ class KimAmm(Base):
         }
         """
 
-    def parse_pool_day_data(self, data: "JSON") -> pd.DataFrame:
-        df = pd.json_normalize(data=data["poolDayDatas"])
+    def _normalize_pool_day_data(self, data: "JSON") -> pd.DataFrame:
         float_columns = [
             "totalLiquidityUSD",
             "dailyVolumeUSD",
@@ -648,8 +1672,13 @@ class KimAmm(Base):
             "date",
             "dailyTransactions",
         ]
-        df[float_columns] = df[float_columns].astype(float)
-        df[int_columns] = df[int_columns].astype(int)
+        df = decode_records(
+            data,
+            selection_paths(self._query_get_pool_day_data()),
+            float_columns=float_columns,
+            int_columns=int_columns,
+            category_columns=["poolId"],
+        )
         df["date"] = pd.to_datetime(df["date"], utc=True, unit="s").dt.date
 
         return df
@@ -657,12 +1686,14 @@ class KimAmm(Base):
     def _query_get_swaps(self) -> str:
         return """
         query getSwaps(
-            $skip: Int = 0,
             $first: Int = 1000,
+            $where: Swap_filter = {},
         ) {
             swaps: swaps(
-                skip: $skip,
                 first: $first,
+                where: $where,
+                orderBy: id,
+                orderDirection: asc,
             ) {
                 id
                 block: transaction {
@@ -678,78 +1709,15 @@ class KimAmm(Base):
         }
         """
 
-    def parse_swaps_data(self, data: "JSON") -> pd.DataFrame:
-        df = pd.json_normalize(data=data["swaps"])
-        # float_columns = [
-        #     "amountFeeUSD",
-        # ]
-        int_columns = [
-            "timestamp",
-        ]
-        # df[float_columns] = df[float_columns].astype(float)
-        df[int_columns] = df[int_columns].astype(int)
-        df["datetime"] = pd.to_datetime(df["timestamp"], utc=True, unit="s")
-        df.drop(columns="timestamp", inplace=True)
-
-        df = df.groupby(pd.Grouper(key="datetime", axis=0, freq="D")).agg(
-            new_swap_count=("id", "count"),
-            # daily_fee_in_usd=("amountFeeUSD", "sum"),
-        )
-        idx = pd.date_range(df.index.min(), pd.Timestamp.utcnow())
-        df = df.reindex(idx, fill_value=0)
-        df.sort_index(ascending=True, inplace=True)
-        df["total_swap_count"] = df["new_swap_count"].cumsum()
-        # df["total_fee_in_usd"] = df["daily_fee_in_usd"].cumsum()
-
-        return df
-
-    def parse_swaps_data_by_pool(self, data: "JSON") -> pd.DataFrame:
-        df = pd.json_normalize(data=data["swaps"])
-        df.rename(
-            columns={
-                "block.block": "block",
-                "poolId.id": "pool_id",
-            },
-            inplace=True,
-        )
-        # float_columns = [
-        #     "amountFeeUSD",
-        # ]
-        int_columns = [
-            "timestamp",
-        ]
-        # df[float_columns] = df[float_columns].astype(float)
-        df[int_columns] = df[int_columns].astype(int)
-        df["date"] = pd.to_datetime(df["timestamp"], utc=True, unit="s").dt.date
-        df.drop(columns="timestamp", inplace=True)
-
-        df = (
-            df.groupby(
-                [
-                    "pool_id",
-                    "date",
-                ]
-            )
-            .agg(
-                new_swap_count=("id", "count"),
-                # daily_fee_in_usd=("dailyFeeUSD", "sum"),
-            )
-            .reset_index()
-        )
-
-        df["total_swap_count"] = df.groupby(["pool_id"])["new_swap_count"].cumsum()
-        # df["total_fee_in_usd"] = df.groupby(["pool_id"])["daily_fee_in_usd"].cumsum()
-
-        return df
-
     def get_df_pool_day(
         self,
         df_pool_day_data: pd.DataFrame,
         df_swaps_data_by_pool: pd.DataFrame,
     ) -> pd.DataFrame:
         df_pool_day = super().get_df_pool_day(df_pool_day_data, df_swaps_data_by_pool)
-        df_pool_day["totalFeeUSD"] = df_pool_day.groupby(["pool_id"])[
-            "dailyFeeUSD"
-        ].cumsum()
+        if "dailyFeeUSD" in df_pool_day:
+            df_pool_day["totalFeeUSD"] = df_pool_day.groupby(
+                ["pool_id"], observed=True
+            )["dailyFeeUSD"].cumsum()
 
         return df_pool_day
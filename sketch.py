@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+# hyperloglog sketches of distinct counts: one row of 2**p one-byte registers
+# per group (e.g. per day). rows merge with `np.maximum`, so per-day sketches
+# combine into any window or running total without the values they were built
+# from. the relative error is about 1.04 / sqrt(2**p), for p from 7 to 16.
+
+
+def hash_values(values) -> np.ndarray:
+    return pd.util.hash_array(np.asarray(values, dtype=object))
+
+
+def sketch(hashes: np.ndarray, groups: np.ndarray, n_groups: int, p: int = 12):
+    # the first p bits of a hash pick a register, which keeps the highest rank
+    # (position of the first set bit) of the remaining bits it has seen. only
+    # 52 of those bits are ranked, so they convert to float64 exactly.
+    bits = min(64 - p, 52)
+    index = (hashes >> np.uint64(64 - p)).astype(np.intp)
+    rest = (hashes << np.uint64(p)) >> np.uint64(64 - bits)
+    rank = (bits + 1 - np.frexp(rest.astype(np.float64))[1]).astype(np.uint8)
+
+    registers = np.zeros((n_groups, 2**p), dtype=np.uint8)
+    np.maximum.at(registers, (groups, index), rank)
+
+    return registers
+
+
+def estimate(registers: np.ndarray) -> np.ndarray:
+    # distinct count of every row, with linear counting for small ranges
+    m = registers.shape[-1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.exp2(-registers.astype(np.float64)).sum(axis=-1)
+    zeros = np.count_nonzero(registers == 0, axis=-1)
+
+    return np.where(
+        (raw <= 2.5 * m) & (zeros > 0), m * np.log(m / np.maximum(zeros, 1)), raw
+    )
+
+
+def merge(keys: pd.Index, registers: np.ndarray) -> tuple:
+    # merges the rows of equal keys, returning the unique keys and their rows
+    unique, inverse = np.unique(keys, return_inverse=True)
+    merged = np.zeros((len(unique), registers.shape[1]), dtype=np.uint8)
+    np.maximum.at(merged, inverse, registers)
+
+    return unique, merged
+
+
+def to_frame(registers: np.ndarray, index: pd.Index) -> pd.DataFrame:
+    # one binary cell per row, which parquet stores far more compactly than
+    # 2**p integer columns
+    return pd.DataFrame({"registers": [row.tobytes() for row in registers]}, index)
+
+
+def from_frame(df: pd.DataFrame, p: int = 12) -> np.ndarray:
+    # `p` only sets the width of an empty frame, whose cells carry none
+    return np.frombuffer(b"".join(df["registers"]), dtype=np.uint8).reshape(
+        len(df), 2**p
+    )
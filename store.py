@@ -0,0 +1,85 @@
+import datetime
+import json
+import os
+
+import pandas as pd
+from utils import concat_frames
+
+
+class Store:
+    # typed frames are kept as `<path>/<entity>/day=YYYY-MM-DD/part.parquet`,
+    # next to a `_state.json` holding the high-water mark (max timestamp or
+    # date, in seconds) of every entity fetched so far.
+    def __init__(self, path: str) -> None:
+        self._path = path
+
+    def _state_path(self) -> str:
+        return os.path.join(self._path, "_state.json")
+
+    def _read_state(self) -> dict:
+        if not os.path.exists(self._state_path()):
+            return {}
+
+        with open(self._state_path()) as f:
+            return json.load(f)
+
+    def _write_state(self, state: dict) -> None:
+        os.makedirs(self._path, exist_ok=True)
+        tmp = self._state_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, self._state_path())
+
+    def high_water_mark(self, entity: str) -> int:
+        return self._read_state().get(entity)
+
+    def read(self, entity: str, since: datetime.date = None) -> pd.DataFrame:
+        # with `since`, only the partitions of that day and later are read
+        path = os.path.join(self._path, entity)
+        if not os.path.isdir(path):
+            return None
+
+        filters = None if since is None else [("day", ">=", since.isoformat())]
+
+        return pd.read_parquet(path, filters=filters).drop(columns="day")
+
+    def _aggregate_path(self, name: str) -> str:
+        return os.path.join(self._path, "_aggregates", f"{name}.parquet")
+
+    def read_aggregate(self, name: str) -> pd.DataFrame:
+        if not os.path.exists(self._aggregate_path(name)):
+            return None
+
+        return pd.read_parquet(self._aggregate_path(name))
+
+    def write_aggregate(self, name: str, df: pd.DataFrame) -> None:
+        # `df.attrs` is kept in the parquet metadata, so an aggregate and the
+        # position it was folded up to are written together, atomically.
+        path = self._aggregate_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        df.to_parquet(path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    def upsert(
+        self,
+        entity: str,
+        df: pd.DataFrame,
+        day: pd.Series,
+        high_water_mark: int,
+    ) -> None:
+        # rows are merged into their day partition by `id`, so refetching the
+        # last (still mutable) day replaces its rows instead of duplicating them.
+        for key, chunk in df.groupby(day.values):
+            path = os.path.join(self._path, entity, f"day={key.isoformat()}")
+            file = os.path.join(path, "part.parquet")
+            if os.path.exists(file):
+                chunk = concat_frames([pd.read_parquet(file), chunk]).drop_duplicates(
+                    subset="id", keep="last"
+                )
+            os.makedirs(path, exist_ok=True)
+            chunk.to_parquet(file + ".tmp", index=False)
+            os.replace(file + ".tmp", file)
+
+        state = self._read_state()
+        state[entity] = max(state.get(entity, high_water_mark), high_water_mark)
+        self._write_state(state)
@@ -0,0 +1,237 @@
+from contextlib import contextmanager
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+
+import psutil
+
+# stages and pages are reported to every registered sink. without sinks, the
+# hooks in the pipeline cost one list check each.
+_sinks = []
+_current_span = contextvars.ContextVar("current_span", default=None)
+_process = psutil.Process()
+
+
+def add_sink(sink) -> None:
+    _sinks.append(sink)
+
+
+def remove_sink(sink) -> None:
+    _sinks.remove(sink)
+
+
+def enabled() -> bool:
+    return bool(_sinks)
+
+
+def emit_page(**event) -> None:
+    # one event per fetched page: query, latency, bytes, rows, first, retries
+    for sink in _sinks:
+        sink.page(event)
+
+
+@contextmanager
+def stage(name: str, **attributes):
+    # times the enclosed block as a span nested under the enclosing stage.
+    # cpu time is process wide, so it includes whatever ran concurrently on
+    # other tasks or threads. the span's attributes can be added to while it
+    # is open, e.g. with the number of rows produced.
+    if not _sinks:
+        yield {"attributes": attributes}
+        return
+
+    parent = _current_span.get()
+    span = {
+        "name": name,
+        "trace_id": secrets.token_hex(16) if parent is None else parent["trace_id"],
+        "span_id": secrets.token_hex(8),
+        "parent_span_id": None if parent is None else parent["span_id"],
+        "attributes": attributes,
+        "status": "ok",
+    }
+    token = _current_span.set(span)
+    rss = _process.memory_info().rss
+    cpu = time.process_time()
+    span["start_time"] = time.time_ns()
+    start = time.perf_counter()
+    try:
+        yield span
+    except BaseException:
+        span["status"] = "error"
+        raise
+    finally:
+        span["wall_seconds"] = time.perf_counter() - start
+        span["end_time"] = span["start_time"] + int(span["wall_seconds"] * 1e9)
+        span["cpu_seconds"] = time.process_time() - cpu
+        span["memory_delta_bytes"] = _process.memory_info().rss - rss
+        _current_span.reset(token)
+        for sink in _sinks:
+            sink.stage(span)
+
+
+def traced(method):
+    # wraps a method of an exchange class in a stage named after the class and
+    # the method
+    if inspect.iscoroutinefunction(method):
+
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            with stage(f"{type(self).__name__}.{method.__name__}"):
+                return await method(self, *args, **kwargs)
+
+    else:
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with stage(f"{type(self).__name__}.{method.__name__}"):
+                return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class Sink:
+    def page(self, event: dict) -> None:
+        pass
+
+    def stage(self, span: dict) -> None:
+        pass
+
+
+class LoggingSink(Sink):
+    def __init__(self, logger: logging.Logger = None, level: int = logging.INFO):
+        self._logger = logger or logging.getLogger("goldsky")
+        self._level = level
+
+    def page(self, event: dict) -> None:
+        self._logger.log(
+            self._level,
+            "page %s: %d rows (first=%s), %d bytes in %.3fs, %d retries",
+            event["query"],
+            event["rows"],
+            event["first"],
+            event["bytes"],
+            event["latency"],
+            event["retries"],
+        )
+
+    def stage(self, span: dict) -> None:
+        self._logger.log(
+            self._level,
+            "stage %s: wall %.3fs, cpu %.3fs, rss %+.1f MiB%s%s",
+            span["name"],
+            span["wall_seconds"],
+            span["cpu_seconds"],
+            span["memory_delta_bytes"] / 2**20,
+            "".join(f", {key}={value}" for key, value in span["attributes"].items()),
+            "" if span["status"] == "ok" else f", {span['status']}",
+        )
+
+
+class PrometheusSink(Sink):
+    # keeps running totals and writes them in the prometheus text format, e.g.
+    # for node_exporter's textfile collector. the file is rewritten whenever a
+    # top level stage ends, and on `flush`. stages may end on parse worker
+    # threads, so updates and writes are serialized by a lock.
+    def __init__(self, path: str, prefix: str = "goldsky") -> None:
+        self._path = path
+        self._prefix = prefix
+        self._metrics = {}
+        self._lock = threading.RLock()
+
+    def _add(self, name: str, labels: dict, value: float) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        self._metrics[key] = self._metrics.get(key, 0) + value
+
+    def page(self, event: dict) -> None:
+        labels = {"query": event["query"]}
+        with self._lock:
+            self._add("pages_total", labels, 1)
+            self._add("page_latency_seconds_sum", labels, event["latency"])
+            self._add("response_bytes_total", labels, event["bytes"])
+            self._add("rows_total", labels, event["rows"])
+            self._add("retries_total", labels, event["retries"])
+
+    def stage(self, span: dict) -> None:
+        labels = {"stage": span["name"]}
+        with self._lock:
+            self._add("stage_calls_total", labels, 1)
+            self._add("stage_wall_seconds_sum", labels, span["wall_seconds"])
+            self._add("stage_cpu_seconds_sum", labels, span["cpu_seconds"])
+            self._add(
+                "stage_memory_delta_bytes_sum", labels, span["memory_delta_bytes"]
+            )
+            if span["status"] != "ok":
+                self._add("stage_errors_total", labels, 1)
+            if span["parent_span_id"] is None:
+                self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            lines = []
+            for (name, labels), value in sorted(self._metrics.items()):
+                label_text = ",".join(
+                    f'{key}="{_escape_label(str(label))}"' for key, label in labels
+                )
+                lines.append(f"{self._prefix}_{name}{{{label_text}}} {value}")
+
+            # the temporary name is per process, in case several write the
+            # same file
+            tmp = f"{self._path}.{os.getpid()}.tmp"
+            os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+            with open(tmp, "w") as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(tmp, self._path)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class SpanSink(Sink):
+    # appends every stage as one line of otlp json (the opentelemetry protocol
+    # encoding of a span), which collectors and trace viewers can import.
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+
+    def stage(self, span: dict) -> None:
+        attributes = {
+            **span["attributes"],
+            "cpu_seconds": span["cpu_seconds"],
+            "memory_delta_bytes": span["memory_delta_bytes"],
+        }
+        record = {
+            "traceId": span["trace_id"],
+            "spanId": span["span_id"],
+            "parentSpanId": span["parent_span_id"] or "",
+            "name": span["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(span["start_time"]),
+            "endTimeUnixNano": str(span["end_time"]),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in attributes.items()
+            ],
+            "status": {"code": 1 if span["status"] == "ok" else 2},
+        }
+
+        os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+        with self._lock, open(self._path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+
+    return {"stringValue": str(value)}
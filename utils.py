@@ -1,10 +1,190 @@
-from gql import Client
+import asyncio
+from contextlib import asynccontextmanager
+import contextvars
+from email.utils import parsedate_to_datetime
+import copy
+from functools import lru_cache
+import hashlib
+import itertools
+import json
+import os
+import random
+import time
+import weakref
+
+import aiohttp
+from gql import Client, gql
 from gql.transport.aiohttp import AIOHTTPTransport
+from gql.transport.exceptions import (
+    TransportProtocolError,
+    TransportQueryError,
+    TransportServerError,
+)
+from graphql import (
+    DocumentNode,
+    NameNode,
+    OperationDefinitionNode,
+    OperationType,
+    SelectionSetNode,
+    VariableNode,
+    Visitor,
+    parse,
+    print_ast,
+    visit,
+)
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+import tracing
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+SCHEMA_CACHE_DIR = os.path.join(".cache", "schemas")
+CONNECTION_LIMIT = 100
+KEEPALIVE_TIMEOUT = 60
+MAX_RETRIES = 6
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+_connectors = weakref.WeakKeyDictionary()
+# bytes received for the request in flight, counted while tracing is enabled
+_response_bytes = contextvars.ContextVar("response_bytes", default=None)
+
+
+def _get_connector() -> aiohttp.TCPConnector:
+    # one connector per event loop, shared by every transport on that loop
+    loop = asyncio.get_running_loop()
+    connector = _connectors.get(loop)
+    if connector is None or connector.closed:
+        connector = aiohttp.TCPConnector(
+            limit=CONNECTION_LIMIT,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+        )
+        _connectors[loop] = connector
+
+    return connector
+
+
+async def close_connections() -> None:
+    connector = _connectors.pop(asyncio.get_running_loop(), None)
+    if connector is not None:
+        await connector.close()
+
+
+def json_loads(data):
+    # orjson parses pages several times faster than the stdlib and reads the
+    # raw bytes without decoding them to str first
+    if orjson is not None:
+        return orjson.loads(data)
+
+    return json.loads(data)
+
+
+def json_dumps(obj) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+
+    return json.dumps(obj)
+
+
+class JSONResponse(aiohttp.ClientResponse):
+    # gql decodes every result with `resp.json(content_type=None)`, which
+    # defaults to `json.loads`. this response class decodes the body bytes
+    # with `json_loads` instead.
+    async def json(self, *, loads=None, content_type="application/json", **kwargs):
+        if loads is not None or content_type is not None:
+            return await super().json(
+                loads=loads or json_loads, content_type=content_type, **kwargs
+            )
+
+        if self._body is None:
+            await self.read()
+        body = self._body.strip()
+        if not body:
+            return None
+
+        return json_loads(body)
+
+
+async def _count_response_bytes(session, context, params) -> None:
+    counter = _response_bytes.get()
+    if counter is not None:
+        counter[0] += len(params.chunk)
+
+
+_response_bytes_trace_config = aiohttp.TraceConfig()
+_response_bytes_trace_config.on_response_chunk_received.append(_count_response_bytes)
+
+
+class PooledAIOHTTPTransport(AIOHTTPTransport):
+    # sessions are opened on the shared connector and never close it, so
+    # sockets (and their tls handshakes) outlive a single crawl and are reused
+    # across subgraphs on the same host. responses are decoded by
+    # `JSONResponse` unless `client_session_args` sets another response class.
+    async def connect(self) -> None:
+        # the merged arguments only live for this call; storing them would add
+        # another byte counting hook to the transport with every session.
+        client_session_args = self.client_session_args
+        self.client_session_args = {
+            "response_class": JSONResponse,
+            **(client_session_args or {}),
+            "connector": _get_connector(),
+            "connector_owner": False,
+            "trace_configs": [
+                *(client_session_args or {}).get("trace_configs", []),
+                _response_bytes_trace_config,
+            ],
+        }
+        try:
+            await super().connect()
+        finally:
+            self.client_session_args = client_session_args
+
+    async def close(self) -> None:
+        # closing the session only detaches it from the shared connector. gql
+        # would wait for the connector's sockets to close as well, since the
+        # session arguments it sees no longer say who owns the connector.
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        await super().close()
+
+
+class SchemaCachingClient(Client):
+    # the introspected schema is kept on disk, so only the first client ever
+    # built for an endpoint pays for the introspection query. delete the file
+    # to pick up a redeployed schema.
+    def __init__(self, schema_path: str, **kwargs) -> None:
+        self._schema_path = schema_path
+        if os.path.exists(schema_path):
+            with open(schema_path) as f:
+                kwargs["introspection"] = json.load(f)
+            kwargs["fetch_schema_from_transport"] = False
+
+        super().__init__(**kwargs)
+
+    async def connect_async(self, *args, **kwargs):
+        session = await super().connect_async(*args, **kwargs)
+
+        if self.introspection is not None and not os.path.exists(self._schema_path):
+            os.makedirs(os.path.dirname(self._schema_path), exist_ok=True)
+            with open(self._schema_path + ".tmp", "w") as f:
+                json.dump(self.introspection, f)
+            os.replace(self._schema_path + ".tmp", self._schema_path)
+
+        return session
 
 
 def get_client(url: str):
-    transport = AIOHTTPTransport(url=url)
-    client = Client(
+    transport = PooledAIOHTTPTransport(url=url)
+    client = SchemaCachingClient(
+        schema_path=os.path.join(
+            SCHEMA_CACHE_DIR, hashlib.sha256(url.encode()).hexdigest() + ".json"
+        ),
         transport=transport,
         fetch_schema_from_transport=True,
     )
@@ -12,32 +192,631 @@ def get_client(url: str):
     return client
 
 
-async def query_until_end(
+@asynccontextmanager
+async def connect(client):
+    # `Client.execute_async` opens and closes the transport on every call and
+    # refuses concurrent use, so crawls run over one explicitly opened session.
+    # an already opened session is passed through untouched.
+    if isinstance(client, Client):
+        async with client as session:
+            yield session
+    else:
+        yield client
+
+
+class PageSizeController:
+    # graph-node caps `first` at 1000, so pages start at the cap. the size is
+    # halved after a slow page or a failed request and doubled back after
+    # fast ones, which keeps heavy pages under the server's query timeout.
+    # crawls sharing a controller (e.g. the shards of one entity) also share
+    # its pause: after a rate limit, none of them sends until it is over.
+    def __init__(
+        self,
+        first: int = 1000,
+        min_first: int = 50,
+        max_first: int = 1000,
+        target_latency: float = 5.0,
+    ) -> None:
+        self.first = first
+        self.min_first = min_first
+        self.max_first = max_first
+        self.target_latency = target_latency
+        self.paused_until = 0.0
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def wait(self) -> None:
+        # a pause may be extended while waiting on it
+        while (delay := self.paused_until - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+
+    def succeeded(self, latency: float) -> None:
+        if latency > self.target_latency:
+            self.first = max(self.min_first, self.first // 2)
+        elif latency < self.target_latency / 2:
+            self.first = min(self.max_first, self.first * 2)
+
+    def failed(self) -> None:
+        self.first = max(self.min_first, self.first // 2)
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, TransportServerError):
+        return error.code is None or error.code in (408, 429) or error.code >= 500
+    if isinstance(error, TransportQueryError):
+        # graph-node reports query timeouts as graphql errors
+        message = str(error).lower()
+        return "timeout" in message or "timed out" in message
+
+    return isinstance(
+        error, (TransportProtocolError, aiohttp.ClientError, asyncio.TimeoutError)
+    )
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    # the server asked for fewer requests (or a later retry), not for cheaper
+    # ones, so the page size is left alone
+    if isinstance(error, TransportServerError) and error.code in (408, 429):
+        return True
+
+    headers = getattr(error.__cause__, "headers", None) or {}
+    return "Retry-After" in headers
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    # a server provided `Retry-After` (seconds or http date) wins over the
+    # exponential backoff, which is fully jittered to spread out the retries
+    # of concurrent shards.
+    headers = getattr(error.__cause__, "headers", None) or {}
+    retry_after = headers.get("Retry-After")
+    if retry_after is not None:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(
+                    0.0, parsedate_to_datetime(retry_after).timestamp() - time.time()
+                )
+            except (TypeError, ValueError):
+                pass
+
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+
+
+class Checkpoint:
+    # the pages of an unfinished crawl, one json line per page. the crawl's
+    # cursor is the last id of the last stored page, so a crawl restarted on
+    # the same checkpoint replays the stored pages and continues after them.
+    # without `resume`, a leftover checkpoint is discarded. with `keep`, a
+    # finished crawl leaves its checkpoint for the caller to clear, e.g. until
+    # the other shards of a sharded crawl are done as well.
+    def __init__(self, path: str, resume: bool = False, keep: bool = False) -> None:
+        self.path = path
+        self.keep = keep
+        if not resume:
+            self.clear()
+
+    def pages(self):
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path) as f:
+            for line in f:
+                yield json_loads(line)
+
+    def append(self, key: str, data: "JSON", first: int) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json_dumps([key, data, first]) + "\n")
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def finish(self) -> None:
+        if not self.keep:
+            self.clear()
+
+
+async def execute_with_retry(
+    session,
+    query,
+    variable_values: dict = None,
+    page_size: PageSizeController = None,
+    max_retries: int = MAX_RETRIES,
+):
+    # retries transient failures. with a page size controller, every attempt
+    # waits out the controller's pause, sets `first` in `variable_values` to
+    # the current page size and reports its latency or failure back to it.
+    if variable_values is None:
+        variable_values = {}
+
+    for attempt in itertools.count():
+        if page_size is not None:
+            await page_size.wait()
+            variable_values["first"] = page_size.first
+        counter = [0]
+        if tracing.enabled():
+            _response_bytes.set(counter)
+        start = time.perf_counter()
+        try:
+            result = await session.execute(query, variable_values=variable_values)
+        except Exception as error:
+            if attempt >= max_retries or not _is_retryable(error):
+                raise
+            delay = _retry_delay(error, attempt)
+            if page_size is None:
+                await asyncio.sleep(delay)
+            elif _is_rate_limited(error):
+                page_size.pause(delay)
+            else:
+                page_size.failed()
+                await asyncio.sleep(delay)
+            continue
+        latency = time.perf_counter() - start
+
+        if page_size is not None:
+            page_size.succeeded(latency)
+
+        if tracing.enabled():
+            # a batched document carries one list per part
+            lists = [data for data in result.values() if isinstance(data, list)]
+            tracing.emit_page(
+                query=_operation_name(query),
+                latency=latency,
+                bytes=counter[0],
+                rows=sum(map(len, lists)) if lists else 1,
+                first=variable_values.get("first"),
+                retries=attempt,
+            )
+
+        return result
+
+
+def _operation_name(query) -> str:
+    operation = query.definitions[0]
+    return "anonymous" if operation.name is None else operation.name.value
+
+
+async def iter_pages(
     client,
     query,
+    where: dict = None,
+    page_size: PageSizeController = None,
+    max_retries: int = MAX_RETRIES,
+    checkpoint: Checkpoint = None,
 ):
-    skip = 0
-    first = 1000
+    # keyset pagination: every template orders by `id` ascending, so each page
+    # starts right after the last id of the previous one. unlike `skip`, the
+    # cost of a page does not grow with its depth and there is no server cap.
+    # the next page is requested before the current one is yielded, so the
+    # consumer's work overlaps with the network round trip.
+    page_size = page_size or PageSizeController()
+    where = dict(where or {})
+
+    if checkpoint is not None:
+        for key, data, first in checkpoint.pages():
+            yield key, data
+
+            if len(data) < first:
+                checkpoint.finish()
+                return
+            where["id_gt"] = data[-1]["id"]
+
+    async with connect(client) as session:
+
+        async def query_page(where):
+            variable_values = {"where": where}
+            result = await execute_with_retry(
+                session,
+                query,
+                variable_values,
+                page_size=page_size,
+                max_retries=max_retries,
+            )
+            key = list(result.keys())[0]
+
+            return key, result[key], variable_values["first"]
+
+        task = asyncio.ensure_future(query_page(dict(where)))
+        try:
+            while task is not None:
+                key, data, first = await task
+                task = None
+                if checkpoint is not None:
+                    checkpoint.append(key, data, first)
+
+                if len(data) == first:
+                    where["id_gt"] = data[-1]["id"]
+                    task = asyncio.ensure_future(query_page(dict(where)))
 
+                yield key, data
+        finally:
+            if task is not None:
+                task.cancel()
+
+    if checkpoint is not None:
+        checkpoint.finish()
+
+
+async def query_until_end(
+    client,
+    query,
+    where: dict = None,
+    page_size: PageSizeController = None,
+    checkpoint: Checkpoint = None,
+):
     all_data = []
 
-    while True:
-        result = await client.execute_async(
-            query,
-            variable_values={
-                "skip": skip,
-                "first": first,
-            },
-        )
+    with tracing.stage("query_until_end", query=_operation_name(query)) as span:
+        async for key, data in iter_pages(
+            client, query, where=where, page_size=page_size, checkpoint=checkpoint
+        ):
+            all_data.extend(data)
+        span["attributes"]["rows"] = len(all_data)
+
+    return {key: all_data}
+
+
+async def query_bounds(
+    client,
+    entity: str,
+    field: str,
+):
+    query = gql(
+        f"""
+        query getBounds {{
+            first: {entity}(
+                first: 1,
+                orderBy: {field},
+                orderDirection: asc,
+            ) {{
+                {field}
+            }}
+            last: {entity}(
+                first: 1,
+                orderBy: {field},
+                orderDirection: desc,
+            ) {{
+                {field}
+            }}
+        }}
+        """
+    )
+
+    async with connect(client) as session:
+        result = await execute_with_retry(session, query)
+
+    if not result["first"]:
+        return None
+
+    return int(result["first"][0][field]), int(result["last"][0][field]) + 1
+
+
+async def query_head_block(client) -> int:
+    # number of the latest block the subgraph has indexed
+    query = gql(
+        """
+        query getHeadBlock {
+            _meta {
+                block {
+                    number
+                }
+            }
+        }
+        """
+    )
+
+    async with connect(client) as session:
+        result = await execute_with_retry(session, query)
+
+    return int(result["_meta"]["block"]["number"])
+
+
+def split_range(
+    start: int,
+    end: int,
+    shards: int,
+):
+    step = -(-(end - start) // shards)
+    return [(lo, min(lo + step, end)) for lo in range(start, end, max(step, 1))]
 
-        key = list(result.keys())[0]
-        data = result[key]
-        count = len(data)
-        all_data.extend(data)
 
-        if count < first:
-            break
+async def query_until_end_sharded(
+    client,
+    query,
+    field: str,
+    start: int,
+    end: int,
+    shards: int,
+    max_concurrency: int = 4,
+    where: dict = None,
+    checkpoint: str = None,
+    resume: bool = False,
+    limit=None,
+):
+    # splits [start, end) on `field` into `shards` windows and crawls them
+    # concurrently over a single session. results are merged in window order.
+    # the shards share one page size controller, since they load the same
+    # endpoint. with a checkpoint path, the windows are saved next to one
+    # checkpoint per shard, so a resumed crawl reuses the original windows.
+    # `limit`, an async context manager entered around every shard, replaces
+    # the `max_concurrency` semaphore, e.g. to share a caller's budget.
+    semaphore = limit or asyncio.Semaphore(max_concurrency)
+    page_size = PageSizeController()
+    windows = split_range(start, end, shards)
+
+    if checkpoint is not None:
+        if resume and os.path.exists(checkpoint + ".json"):
+            with open(checkpoint + ".json") as f:
+                windows = json.load(f)
         else:
-            skip += first
+            os.makedirs(os.path.dirname(checkpoint) or ".", exist_ok=True)
+            with open(checkpoint + ".json", "w") as f:
+                json.dump(windows, f)
+
+    async def query_shard(session, index, lo, hi):
+        async with semaphore:
+            return await query_until_end(
+                session,
+                query,
+                where={
+                    **(where or {}),
+                    f"{field}_gte": str(lo),
+                    f"{field}_lt": str(hi),
+                },
+                page_size=page_size,
+                checkpoint=(
+                    None
+                    if checkpoint is None
+                    else Checkpoint(
+                        f"{checkpoint}-{index}.jsonl", resume=resume, keep=True
+                    )
+                ),
+            )
+
+    async with connect(client) as session:
+        with tracing.stage(
+            "query_until_end_sharded", query=_operation_name(query), shards=shards
+        ):
+            results = await asyncio.gather(
+                *[
+                    query_shard(session, index, lo, hi)
+                    for index, (lo, hi) in enumerate(windows)
+                ]
+            )
+
+    # finished shards keep their pages until every shard is done, so a resumed
+    # crawl only fetches what the failed run had not.
+    if checkpoint is not None:
+        for index in range(len(windows)):
+            Checkpoint(f"{checkpoint}-{index}.jsonl", resume=True).clear()
+        os.remove(checkpoint + ".json")
+
+    key = list(results[0].keys())[0]
+    all_data = [row for result in results for row in result[key]]
 
     return {key: all_data}
+
+
+class _PrefixVariables(Visitor):
+    def __init__(self, prefix: str) -> None:
+        super().__init__()
+        self.prefix = prefix
+
+    def enter_variable(self, node, *args):
+        if node.name.value != "first":
+            return VariableNode(name=NameNode(value=self.prefix + node.name.value))
+
+
+@lru_cache
+def _field_key(query: str) -> str:
+    field = parse(query).definitions[0].selection_set.selections[0]
+    return (field.alias or field.name).value
+
+
+@lru_cache
+def batch_document(queries: tuple) -> str:
+    # merges the templates into one operation. the fields and variables of the
+    # i-th template get a `q<i>_` prefix, e.g. `q1_swaps` and `$q1_where`,
+    # except `$first`, which all parts share so the page size controller
+    # still sizes every page.
+    variable_definitions = {}
+    selections = []
+    for index, query in enumerate(queries):
+        prefix = f"q{index}_"
+        operation = visit(parse(query).definitions[0], _PrefixVariables(prefix))
+        for definition in operation.variable_definitions:
+            variable_definitions.setdefault(definition.variable.name.value, definition)
+        for selection in operation.selection_set.selections:
+            selection = copy.copy(selection)
+            selection.alias = NameNode(
+                value=prefix + (selection.alias or selection.name).value
+            )
+            selections.append(selection)
+
+    operation = OperationDefinitionNode(
+        operation=OperationType.QUERY,
+        name=NameNode(value="batch"),
+        variable_definitions=tuple(variable_definitions.values()),
+        directives=(),
+        selection_set=SelectionSetNode(selections=tuple(selections)),
+    )
+
+    return print_ast(DocumentNode(definitions=(operation,)))
+
+
+async def query_until_end_batched(
+    client,
+    parts: list,
+    max_parts: int = 8,
+    page_size: PageSizeController = None,
+    max_retries: int = MAX_RETRIES,
+) -> list:
+    # crawls several (template, where) parts, e.g. different entities or the
+    # shards of one, with one aliased document per request carrying the next
+    # page of up to `max_parts` unfinished parts. each part keeps its own
+    # keyset cursor, and finished parts drop out of the document. returns one
+    # `{key: all_data}` per part, in order.
+    page_size = page_size or PageSizeController()
+    wheres = [dict(where or {}) for _, where in parts]
+    results = [{} for _ in parts]
+    pending = list(range(len(parts)))
+
+    async with connect(client) as session:
+        with tracing.stage("query_until_end_batched", parts=len(parts)):
+            while pending:
+                batch = pending[:max_parts]
+                query = gql(batch_document(tuple(parts[i][0] for i in batch)))
+                variable_values = {
+                    f"q{index}_where": wheres[i] for index, i in enumerate(batch)
+                }
+                result = await execute_with_retry(
+                    session,
+                    query,
+                    variable_values,
+                    page_size=page_size,
+                    max_retries=max_retries,
+                )
+
+                for index, i in enumerate(batch):
+                    key = _field_key(parts[i][0])
+                    data = result[f"q{index}_{key}"]
+                    results[i].setdefault(key, []).extend(data)
+                    if len(data) < variable_values["first"]:
+                        pending.remove(i)
+                    else:
+                        wheres[i]["id_gt"] = data[-1]["id"]
+
+    return results
+
+
+@lru_cache
+def selection_paths(query: str) -> tuple:
+    # leaf fields of the queried entity as paths of response keys (aliases
+    # included), e.g. `poolId: pool { id }` -> ("poolId", "id")
+    def walk(selections, prefix):
+        for selection in selections:
+            key = (selection.alias or selection.name).value
+            if selection.selection_set:
+                yield from walk(selection.selection_set.selections, prefix + (key,))
+            else:
+                yield prefix + (key,)
+
+    field = parse(query).definitions[0].selection_set.selections[0]
+
+    return tuple(walk(field.selection_set.selections, ()))
+
+
+@lru_cache
+def project(query: str, columns: tuple) -> str:
+    # keeps the leaf fields of the queried entity whose dotted path (aliases
+    # included) is one of `columns` or lies under one, e.g. "token0" keeps all
+    # of `token0 { ... }`. objects left without fields are dropped. `id`, the
+    # time fields and the pool are always kept, pagination, the daily
+    # aggregations and the per-pool joins rely on them.
+    columns = set(columns)
+    unknown = set(columns)
+
+    def prune(node, prefix):
+        selections = []
+        for selection in node.selection_set.selections:
+            path = prefix + ((selection.alias or selection.name).value,)
+            name = ".".join(path)
+            if name in columns or name in {"id", "timestamp", "date", "poolId"}:
+                unknown.discard(name)
+                selections.append(selection)
+            elif selection.selection_set:
+                selection = prune(selection, path)
+                if selection is not None:
+                    selections.append(selection)
+        if not selections:
+            return None
+
+        node = copy.copy(node)
+        node.selection_set = SelectionSetNode(selections=tuple(selections))
+        return node
+
+    operation = copy.copy(parse(query).definitions[0])
+    operation.selection_set = SelectionSetNode(
+        selections=(prune(operation.selection_set.selections[0], ()),)
+    )
+    if unknown:
+        raise ValueError(f"unknown columns: {sorted(unknown)}")
+
+    return print_ast(DocumentNode(definitions=(operation,)))
+
+
+def decode_records(
+    data: "JSON",
+    paths: tuple,
+    float_columns: list = (),
+    int_columns: list = (),
+    category_columns: list = (),
+    rename: dict = None,
+) -> pd.DataFrame:
+    # reads each declared field straight into a typed numpy column, skipping
+    # `json_normalize` and its intermediate object columns. columns are named
+    # by their dotted path unless renamed. addresses go to category columns,
+    # which store each distinct value once plus small integer codes. fields
+    # missing from the records, as left out by a projected query, are skipped.
+    rename = rename or {}
+    if data:
+        paths = [path for path in paths if _has_path(data[0], path)]
+    float_columns = set(float_columns)
+    int_columns = set(int_columns)
+    category_columns = set(category_columns)
+
+    with tracing.stage("decode_records", rows=len(data)):
+        columns = {}
+        for path in paths:
+            name = rename.get(".".join(path), ".".join(path))
+            if len(path) == 1:
+                values = [row[path[0]] for row in data]
+            else:
+                values = []
+                for row in data:
+                    for key in path:
+                        row = row[key]
+                    values.append(row)
+
+            if name in float_columns:
+                columns[name] = np.array(values, dtype=np.float64)
+            elif name in int_columns:
+                columns[name] = np.array(values, dtype=np.int64)
+            elif name in category_columns:
+                columns[name] = pd.Categorical(values)
+            else:
+                columns[name] = np.array(values, dtype=object)
+
+        df = pd.DataFrame(columns)
+
+    return df
+
+
+def _has_path(row: dict, path: tuple) -> bool:
+    for key in path:
+        if key not in row:
+            return False
+        row = row[key]
+
+    return True
+
+
+def concat_frames(frames: list, ignore_index: bool = True) -> pd.DataFrame:
+    # `pd.concat` falls back to object columns when categories differ between
+    # frames, so categorical columns are unioned explicitly.
+    df = pd.concat(frames, ignore_index=ignore_index)
+    for name in frames[0].select_dtypes("category"):
+        df[name] = union_categoricals([frame[name] for frame in frames])
+
+    return df
+
+
+def unify_categories(*series: pd.Series) -> list:
+    # gives categorical series one shared set of categories, so merges and
+    # groupbys across them work on the integer codes.
+    categories = union_categoricals(list(series)).categories
+
+    return [s.cat.set_categories(categories) for s in series]